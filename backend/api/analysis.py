@@ -1,20 +1,38 @@
 """Analysis endpoints"""
 
-from fastapi import APIRouter, HTTPException, Depends, Body
-from typing import Optional
+import asyncio
+import base64
+from fastapi import APIRouter, HTTPException, Depends, Body, Header, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from typing import Optional, Tuple
 from bson import ObjectId
+from pymongo import ReturnDocument
+from datetime import datetime
 from pydantic import BaseModel
 
+from config import settings
 from database import get_database
 from database.schemas import Analysis
 from api.auth import get_current_user
-from services.ai_service import AIService
+from api.screenshot import screenshot_entry
+from services.ai_admission import ai_admission, ai_caller, use_ai_caller, AICaller, AIOverloaded
 from services.analysis_engine import AnalysisEngine
-from services.osint_service import OsintService
+from services.providers import get_ai_service, get_osint_service
+from services.handle_candidates import generate_candidates
+from services.image_processor import ImageProcessor
+from services.stats_buffer import stats_buffer
+from utils.deadline import Deadline
+from utils.etag import make_etag, match_etag, not_modified, tagged_response
+from utils.helpers import format_sse
+from utils.fields import FieldSelection, sparse_fields
+from utils.metrics import span
+from utils.priority import PRIORITY_BACKGROUND
+from utils.responses import FastJSONRoute
 
-router = APIRouter()
-ai_service = AIService()
-osint_service = OsintService()
+router = APIRouter(route_class=FastJSONRoute)
+
+# Enrichments still running after their request returned
+_background_tasks = set()
 
 
 class AnalysisRequest(BaseModel):
@@ -22,22 +40,25 @@ class AnalysisRequest(BaseModel):
     screenshot_index: int = 0
 
 
-@router.post("/")
-async def analyze_screenshot(
-    request: AnalysisRequest,
-    current_user: dict = Depends(get_current_user)
-):
-    """Analyze a screenshot from a conversation"""
-    
-    db = await get_database()
-    user_id = current_user["_id"]
+def ai_busy(e: AIOverloaded) -> HTTPException:
+    """503 telling the client when the model should have room again"""
+    return HTTPException(
+        status_code=503,
+        detail="The AI service is busy, please retry shortly",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+async def _load_screenshot(db, request: AnalysisRequest, current_user: dict):
+    """Fetch the conversation, check ownership and decode the requested screenshot"""
     conversation_id = request.conversation_id
     screenshot_index = request.screenshot_index
     
     # Get conversation
     try:
         conv_obj_id = ObjectId(conversation_id)
-        conversation = await db.conversations.find_one({"_id": conv_obj_id})
+        with span("db.conversation_fetch"):
+            conversation = await db.conversations.find_one({"_id": conv_obj_id})
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
@@ -59,65 +80,69 @@ async def analyze_screenshot(
     image_data = screenshot["image_data"]
     
     # Decode base64 image
-    import base64
-    image_bytes = base64.b64decode(image_data)
+    with span("decode_image"):
+        image_bytes = base64.b64decode(image_data)
     
-    # Get user preferences for context
+    return conv_obj_id, len(screenshots), image_bytes
+
+
+async def _run_model(
+    current_user: dict,
+    conv_obj_id: ObjectId,
+    screenshot_count: int,
+    image_bytes: bytes,
+    osint_context: Optional[dict],
+    deadline: Optional[Deadline] = None
+) -> Tuple[dict, Analysis]:
+    """Run the vision analysis and structure it; nothing is written. 504 if it misses `deadline`"""
     user_preferences = current_user.get("preferences", {})
-    advanced_mode = user_preferences.get("advanced_mode", False)
-    
-    print(f"Advanced mode: {advanced_mode}")
-    print(f"User preferences: {user_preferences}")
-    
-    osint_context = None
-    
-    # Advanced Mode: OSINT Background Check
-    if advanced_mode:
-        try:
-            # 1. Extract Metadata to find username
-            metadata = await ai_service.extract_metadata(image_bytes)
-            print(f"Metadata: {metadata}")
-            username = metadata.get("username")
-            print(f"Username: {username}")
-            
-            # Clean username and check validity
-            if username and isinstance(username, str) and username.lower() not in ["unknown", "null", "none"]:
-                # Remove @ if present
-                if username.startswith("@"):
-                    username = username[1:]
-                    
-                print(f"Cleaned username: {username}")
-                
-                # 2. Run OSINT Check
-                # Note: This increases latency but provides deeper context
-                osint_context = await osint_service.check_username(username)
-                print(f"OSINT context: {osint_context}")
-        except Exception as e:
-            print(f"OSINT check failed (continuing without it): {e}")
     
     # Determine conversation stage (simplified - could be enhanced)
-    screenshot_count = len(screenshots)
     conversation_stage = "early" if screenshot_count <= 3 else "established"
     
     # Analyze with AI
     try:
-        ai_response = await ai_service.analyze_screenshot(
+        content = await get_ai_service().analyze_screenshot_text(
             image_bytes,
             user_preferences,
             conversation_stage,
-            osint_context=osint_context
+            osint_context=osint_context,
+            timeout=deadline.remaining() if deadline else None
+        )
+        # Validate the model text straight into the structured Analysis
+        analysis = AnalysisEngine.parse_model_output(
+            content,
+            str(conv_obj_id),
+            current_user.get("uuid") # Use UUID consistently
         )
+    except AIOverloaded as e:
+        raise ai_busy(e)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Analysis timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
     
-    # Process AI response into structured format
+    ai_response = {"platform": analysis.platform, "participant_name": analysis.participant_name}
+    return ai_response, analysis
+
+
+async def _persist_analysis(
+    db,
+    current_user: dict,
+    conv_obj_id: ObjectId,
+    ai_response: dict,
+    analysis: Analysis,
+    upload: Optional[dict] = None
+) -> dict:
+    """
+    Store an analysis, update stats and return the API payload.
+    
+    `upload` is a screenshot that arrived with the analyze request and is only
+    stored now: {"screenshot": <entry>, "conversation": <new document or None>}.
+    The payload then also carries its `screenshot_id` and `screenshot_index`.
+    """
+    user_id = current_user["_id"]
     user_uuid = current_user.get("uuid")
-    engine = AnalysisEngine()
-    analysis = engine.process_ai_response(
-        ai_response,
-        str(conv_obj_id),
-        user_uuid # Use UUID consistently
-    )
     
     # Update conversation with extracted metadata (platform/participant)
     update_data = {}
@@ -126,7 +151,29 @@ async def analyze_screenshot(
     if "participant_name" in ai_response and ai_response["participant_name"]:
         update_data["participant_name"] = ai_response["participant_name"]
     
-    if update_data:
+    if upload:
+        # Screenshot, extracted metadata and, for a new conversation, the document itself in one write
+        update = {
+            "$push": {"screenshots": upload["screenshot"]},
+            "$set": {**update_data, "updated_at": datetime.utcnow()}
+        }
+        new_conversation = upload["conversation"]
+        if new_conversation is not None:
+            update["$setOnInsert"] = {
+                key: value for key, value in new_conversation.items() if key not in update["$set"]
+            }
+        with span("db.conversation_write"):
+            # Its index is only known after the push: other uploads may land meanwhile
+            conversation = await db.conversations.find_one_and_update(
+                {"_id": conv_obj_id},
+                update,
+                projection={"screenshots.uploaded_at": 1},
+                upsert=new_conversation is not None,
+                return_document=ReturnDocument.AFTER
+            )
+        if conversation is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+    elif update_data:
         await db.conversations.update_one(
             {"_id": conv_obj_id},
             {"$set": update_data}
@@ -134,23 +181,18 @@ async def analyze_screenshot(
     
     # Save analysis to database
     analysis_dict = analysis.model_dump(by_alias=True, exclude={"id"})
-    result = await db.analyses.insert_one(analysis_dict)
-    
-    # Update user stats - use UUID to find/update user? No, users collection uses ObjectId as _id
-    # BUT stats update usually targets the user document itself.
-    # If the user document uses ObjectId as _id, we must use that for the update query.
-    # HOWEVER, the requirement is "Never object id at anycost use the uuid for mapping".
-    # This implies the 'user_id' field in related documents (conversations, analyses) MUST be UUID.
+    with span("db.analysis_write"):
+        result = await db.analyses.insert_one(analysis_dict)
     
-    await db.users.update_one(
-        {"_id": user_id}, # This is the internal MongoDB _id of the user, which is ObjectId. This is fine for finding the user doc itself.
-        {"$inc": {"stats.total_analyses": 1}}
-    )
+    # Update user stats - users collection uses ObjectId as _id, so the counter is keyed by it.
+    # Increments are coalesced in memory and flushed as one bulk write.
+    stats_buffer.increment(user_id, "total_analyses")
     
     # Enforce 50 analysis limit per user
     try:
         # Count total analyses for this user using UUID
-        total_analyses = await db.analyses.count_documents({"user_id": user_uuid})
+        with span("db.analysis_count"):
+            total_analyses = await db.analyses.count_documents({"user_id": user_uuid})
         
         if total_analyses > 50:
             # Find oldest analyses to remove
@@ -176,15 +218,352 @@ async def analyze_screenshot(
     if "_id" in analysis_dict:
         del analysis_dict["_id"]
     
+    if upload:
+        analysis_dict["screenshot_id"] = str(upload["screenshot"]["id"])
+        analysis_dict["screenshot_index"] = len(conversation.get("screenshots", [])) - 1
+    
     return analysis_dict
 
 
+async def _finish_analysis(
+    db,
+    current_user: dict,
+    conv_obj_id: ObjectId,
+    screenshot_count: int,
+    image_bytes: bytes,
+    osint_context: Optional[dict],
+    upload: Optional[dict] = None
+) -> dict:
+    """Run the vision analysis, persist it and return the API payload"""
+    ai_response, analysis = await _run_model(
+        current_user, conv_obj_id, screenshot_count, image_bytes, osint_context
+    )
+    return await _persist_analysis(db, current_user, conv_obj_id, ai_response, analysis, upload)
+
+
+async def _osint_lookup(image_bytes: bytes, deadline: Optional[Deadline] = None) -> Optional[dict]:
+    """Metadata extraction followed by a scan of the likely handles; None when nothing usable turns up"""
+    metadata = await get_ai_service().extract_metadata(
+        image_bytes, timeout=deadline.remaining() if deadline else None
+    )
+    candidates = generate_candidates(metadata=metadata)
+    if not candidates:
+        return None
+    with span("osint.lookup"):
+        osint_context = await get_osint_service().check_candidates(candidates)
+    if not osint_context or osint_context.get("error"):
+        return None
+    return osint_context
+
+
+# Left out of analysis reads unless asked for with fields=
+SLIM_EXCLUDE = ("raw_ai_response",)
+
+# An analysis only changes when its background enrichment lands
+VERSION_FIELDS = ("timestamp", "updated_at", "enrichment_status")
+
+
+def _check_analysis_owner(analysis: Optional[dict], user_uuid: str):
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    # Verify ownership using UUID
+    if str(analysis.get("user_id")) != str(user_uuid):
+        raise HTTPException(status_code=403, detail="Access denied")
+
+
+def _analysis_etag(analysis_id: str, analysis: dict, selection: FieldSelection) -> str:
+    return make_etag(
+        "analysis", analysis_id, analysis.get("updated_at") or analysis.get("timestamp"),
+        analysis.get("enrichment_status"), selection.key
+    )
+
+# Fields replaced when a background enrichment finishes
+ENRICHED_FIELDS = {
+    "interest_score", "vibe_report", "red_flags", "green_flags",
+    "power_dynamics", "suggested_replies", "wingman_notes", "raw_ai_response"
+}
+
+
+def _spawn(coro):
+    """Start a background task and keep a reference so it is not garbage collected"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def _enriched_model_run(
+    current_user: dict,
+    conv_obj_id: ObjectId,
+    screenshot_count: int,
+    image_bytes: bytes,
+    osint_task: "asyncio.Task",
+    caller: AICaller
+) -> Optional[Tuple[dict, Analysis]]:
+    """Wait for the OSINT lookup, then re-run the analysis with it; None if it found nothing"""
+    # Its own caller, so the call can drop to background priority if the request stops waiting
+    ai_caller.set(caller)
+    osint_context = await osint_task
+    if not osint_context:
+        return None
+    return await _run_model(current_user, conv_obj_id, screenshot_count, image_bytes, osint_context)
+
+
+async def _complete_enrichment(db, analysis_id: str, enriched_task: "asyncio.Task"):
+    """Store the enriched analysis once the deadline-cut work finishes"""
+    update = {"enrichment_status": "complete"}
+    try:
+        result = await enriched_task
+        if result:
+            _, analysis = result
+            update.update(analysis.model_dump(include=ENRICHED_FIELDS))
+    except Exception as e:
+        print(f"Background enrichment failed for analysis {analysis_id}: {e}")
+        update = {"enrichment_status": "failed"}
+    # Changes the analysis ETag
+    update["updated_at"] = datetime.utcnow()
+    
+    try:
+        await db.analyses.update_one({"_id": ObjectId(analysis_id)}, {"$set": update})
+    except Exception as e:
+        print(f"Error storing enrichment for analysis {analysis_id}: {e}")
+
+
+async def _analyze_with_deadline(
+    db,
+    current_user: dict,
+    conv_obj_id: ObjectId,
+    screenshot_count: int,
+    image_bytes: bytes,
+    upload: Optional[dict] = None
+) -> dict:
+    """
+    Advanced-mode analysis bounded by `analysis_deadline`.
+    
+    The OSINT lookup and a first-pass analysis without it run concurrently. If
+    OSINT lands with enough time left for another model call, the enriched
+    analysis is returned; otherwise the first pass is returned with
+    `skipped_enrichments` set and the enrichment finishes in the background.
+    Metadata extraction and the first pass are cut off at the deadline; a
+    first pass that misses it leaves nothing to return, so the request gets 504.
+    """
+    deadline = Deadline(settings.analysis_deadline)
+    osint_task = asyncio.create_task(_osint_lookup(image_bytes, deadline))
+    base_task = asyncio.create_task(
+        _run_model(current_user, conv_obj_id, screenshot_count, image_bytes, None, deadline)
+    )
+    enrich_caller = AICaller(current_user.get("uuid"))
+    enriched_task = asyncio.create_task(
+        _enriched_model_run(current_user, conv_obj_id, screenshot_count, image_bytes, osint_task, enrich_caller)
+    )
+    
+    result = None
+    skipped = False
+    try:
+        # Leave room for the enriched model call if OSINT is slow
+        await deadline.wait(osint_task, reserve=settings.analysis_model_reserve)
+        result = await deadline.wait(enriched_task)
+    except asyncio.TimeoutError:
+        skipped = True
+    except Exception as e:
+        print(f"OSINT enrichment failed (continuing without it): {e}")
+        enriched_task.cancel()
+    
+    try:
+        if result is not None:
+            base_task.cancel()
+        else:
+            # Bounded by the deadline itself (504 when the model misses it)
+            result = await base_task
+    except Exception:
+        enriched_task.cancel()
+        osint_task.cancel()
+        raise
+    ai_response, analysis = result
+    
+    if skipped:
+        # Nobody waits for the enrichment any more: let interactive calls go first
+        ai_admission.reprioritize(enrich_caller, PRIORITY_BACKGROUND)
+        analysis.skipped_enrichments = ["osint"]
+        analysis.enrichment_status = "pending"
+    analysis_dict = await _persist_analysis(db, current_user, conv_obj_id, ai_response, analysis, upload)
+    
+    if skipped:
+        _spawn(_complete_enrichment(db, analysis_dict["id"], enriched_task))
+    analysis_dict["partial"] = skipped
+    return analysis_dict
+
+
+@router.post("/")
+async def analyze_screenshot(
+    request: AnalysisRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Analyze a screenshot from a conversation"""
+    
+    use_ai_caller(current_user.get("uuid"))
+    db = await get_database()
+    conv_obj_id, screenshot_count, image_bytes = await _load_screenshot(db, request, current_user)
+    
+    # Get user preferences for context
+    user_preferences = current_user.get("preferences", {})
+    advanced_mode = user_preferences.get("advanced_mode", False)
+    
+    print(f"Advanced mode: {advanced_mode}")
+    print(f"User preferences: {user_preferences}")
+    
+    # Advanced Mode: OSINT Background Check, bounded by the request deadline
+    if advanced_mode:
+        return await _analyze_with_deadline(db, current_user, conv_obj_id, screenshot_count, image_bytes)
+    
+    return await _finish_analysis(db, current_user, conv_obj_id, screenshot_count, image_bytes, None)
+
+
+@router.post("/upload")
+async def upload_and_analyze(
+    image: UploadFile = File(...),
+    platform: Optional[str] = Form(None),
+    participant_name: Optional[str] = Form(None),
+    conversation_id: Optional[str] = Form(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Upload a screenshot and analyze it in one request.
+    
+    Replaces /api/screenshot/upload followed by /api/analyze/: the image is
+    analyzed straight from the request instead of being read back from the
+    conversation, and is stored together with the analysis once it succeeds.
+    Returns the analysis plus `screenshot_id` and `screenshot_index`.
+    """
+    
+    use_ai_caller(current_user.get("uuid"))
+    with span("read_upload"):
+        image_bytes = await image.read()
+    try:
+        processed = await ImageProcessor.process_image_bytes(image_bytes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    db = await get_database()
+    user_uuid = current_user.get("uuid")
+    
+    if conversation_id:
+        try:
+            conv_obj_id = ObjectId(conversation_id)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid conversation ID")
+        # Ownership and screenshot count only; the stored images aren't needed
+        with span("db.conversation_fetch"):
+            conversation = await db.conversations.find_one(
+                {"_id": conv_obj_id}, {"user_id": 1, "screenshots.uploaded_at": 1}
+            )
+        if not conversation or conversation["user_id"] != user_uuid:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        screenshot_count = len(conversation.get("screenshots", [])) + 1
+        new_conversation = None
+    else:
+        # Created by the same write that stores the screenshot
+        conv_obj_id = ObjectId()
+        screenshot_count = 1
+        new_conversation = {
+            "user_id": user_uuid,
+            "platform": platform or "unknown",
+            "participant_name": participant_name,
+            "created_at": datetime.utcnow()
+        }
+    
+    with span("encode_image"):
+        image_data = base64.b64encode(image_bytes).decode("utf-8")
+    upload = {"screenshot": screenshot_entry(image_data, processed), "conversation": new_conversation}
+    
+    if current_user.get("preferences", {}).get("advanced_mode", False):
+        analysis_dict = await _analyze_with_deadline(
+            db, current_user, conv_obj_id, screenshot_count, image_bytes, upload
+        )
+    else:
+        analysis_dict = await _finish_analysis(
+            db, current_user, conv_obj_id, screenshot_count, image_bytes, None, upload
+        )
+    
+    return analysis_dict
+
+
+@router.post("/stream")
+async def analyze_screenshot_stream(
+    request: AnalysisRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Analyze a screenshot, streaming progress as Server-Sent Events.
+    
+    In advanced mode, emits `metadata`, then `account`/`summary` events as OSINT
+    profiles are confirmed, then `osint_done`. Always ends with `analysis` or `error`.
+    """
+    
+    use_ai_caller(current_user.get("uuid"))
+    db = await get_database()
+    conv_obj_id, screenshot_count, image_bytes = await _load_screenshot(db, request, current_user)
+    advanced_mode = current_user.get("preferences", {}).get("advanced_mode", False)
+    
+    async def event_stream():
+        osint_context = None
+        
+        if advanced_mode:
+            try:
+                metadata = await get_ai_service().extract_metadata(image_bytes)
+                candidates = generate_candidates(metadata=metadata)
+                yield format_sse("metadata", {"candidates": candidates, "platform": metadata.get("platform")})
+                
+                if candidates:
+                    async for event in get_osint_service().stream_candidates(candidates):
+                        if event["event"] == "done":
+                            osint_context = event["data"]
+                            yield format_sse("osint_done", event["data"])
+                        elif event["event"] == "error":
+                            yield format_sse("osint_error", event["data"])
+                        else:
+                            yield format_sse(event["event"], event["data"])
+            except Exception as e:
+                print(f"OSINT check failed (continuing without it): {e}")
+                yield format_sse("osint_error", {"error": str(e)})
+        
+        try:
+            analysis_dict = await _finish_analysis(
+                db, current_user, conv_obj_id, screenshot_count, image_bytes, osint_context
+            )
+        except HTTPException as e:
+            error = {"detail": e.detail}
+            if e.headers and "Retry-After" in e.headers:
+                error["retry_after"] = int(e.headers["Retry-After"])
+            yield format_sse("error", error)
+            return
+        except Exception as e:
+            print(f"Streaming analysis failed: {e}")
+            yield format_sse("error", {"detail": "Analysis failed"})
+            return
+        
+        yield format_sse("analysis", analysis_dict)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/{analysis_id}")
 async def get_analysis(
     analysis_id: str,
+    selection: FieldSelection = Depends(sparse_fields(SLIM_EXCLUDE, required=("user_id",) + VERSION_FIELDS)),
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get analysis by ID"""
+    """
+    Get analysis by ID; pass fields=* to include raw_ai_response.
+    
+    Carries an ETag. A matching If-None-Match is answered with 304 after a
+    version-only lookup, so the document is neither loaded nor serialized.
+    """
     
     db = await get_database()
     user_uuid = current_user["uuid"]
@@ -194,21 +573,25 @@ async def get_analysis(
              raise HTTPException(status_code=400, detail="Invalid analysis ID format")
              
         analysis_obj_id = ObjectId(analysis_id)
-        analysis = await db.analyses.find_one({"_id": analysis_obj_id})
+        if if_none_match:
+            version = await db.analyses.find_one(
+                {"_id": analysis_obj_id},
+                {field: 1 for field in ("user_id",) + VERSION_FIELDS}
+            )
+            _check_analysis_owner(version, user_uuid)
+            matched = match_etag(if_none_match, _analysis_etag(analysis_id, version, selection))
+            if matched:
+                return not_modified(matched)
         
-        if not analysis:
-            raise HTTPException(status_code=404, detail="Analysis not found")
-            
-        # Verify ownership using UUID
-        analysis_user_id = analysis.get("user_id")
-        if str(analysis_user_id) != str(user_uuid):
-            raise HTTPException(status_code=403, detail="Access denied")
+        analysis = await db.analyses.find_one({"_id": analysis_obj_id}, selection.projection)
+        _check_analysis_owner(analysis, user_uuid)
+        etag = _analysis_etag(analysis_id, analysis, selection)
         
         analysis["id"] = str(analysis["_id"])
         if "_id" in analysis:
             del analysis["_id"]
             
-        return analysis
+        return tagged_response(selection.trim(analysis), etag)
     except HTTPException:
         raise
     except Exception as e:
@@ -264,6 +647,7 @@ async def delete_analysis(
 @router.get("/conversation/{conversation_id}")
 async def get_conversation_analyses(
     conversation_id: str,
+    selection: FieldSelection = Depends(sparse_fields(SLIM_EXCLUDE)),
     current_user: dict = Depends(get_current_user)
 ):
     """Get all analyses for a conversation"""
@@ -280,7 +664,8 @@ async def get_conversation_analyses(
         
         # Get analyses
         analyses = await db.analyses.find(
-            {"conversation_id": conv_obj_id}
+            {"conversation_id": conv_obj_id},
+            selection.projection
         ).sort("timestamp", -1).to_list(length=100)
         
         for analysis in analyses:
@@ -1,19 +1,27 @@
 """Authentication endpoints"""
 
-from fastapi import APIRouter, HTTPException, Depends, status
+import copy
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import Optional, Dict
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 from config import settings
 from database import get_database
 from database.schemas import User, UserPreferences
+from middleware.rate_limit import token_payload
+from services.stats_buffer import stats_buffer
+from utils.cache import TTLCache
+from utils.executor import BoundedExecutor, ExecutorBusy
+from utils.metrics import span
+from utils.responses import FastJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 # Configure password context with bcrypt, but handle compatibility issues
 try:
@@ -24,6 +32,21 @@ except Exception:
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
+# bcrypt costs 100-300 ms of CPU per call; keep it off the event loop
+password_executor = BoundedExecutor(
+    "bcrypt",
+    workers=settings.password_hash_workers or None,
+    max_pending=settings.password_hash_max_pending or None
+)
+
+# Authenticated user documents keyed by the JWT "sub" claim
+user_cache = TTLCache(maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl)
+
+# Minimum accepted "ver" claim per user id for stateless tokens.
+# Per-process: each worker learns newer versions from profile updates and full loads,
+# and trusts no claims for a user until it has done one full load of them.
+token_versions: Dict[str, int] = {}
+
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -75,6 +98,18 @@ def get_password_hash(password: str) -> str:
         return pwd_context.hash(password)
 
 
+async def run_password_task(fn, *args):
+    """Run a bcrypt helper on the password executor, answering 503 when it is saturated"""
+    try:
+        return await password_executor.run(fn, *args)
+    except ExecutorBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication is busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT token"""
     to_encode = data.copy()
@@ -87,29 +122,85 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    """Get current authenticated user"""
+def create_user_token(user: dict) -> str:
+    """Create the access token for a user document, embedding claims when stateless tokens are enabled"""
+    data = {"sub": str(user["_id"])}
+    if settings.stateless_tokens:
+        data.update({
+            "uuid": user.get("uuid"),
+            "prefs": user.get("preferences", {}),
+            "ver": user.get("prefs_version", 0)
+        })
+    return create_access_token(
+        data=data, expires_delta=timedelta(minutes=settings.access_token_expire_minutes)
+    )
+
+
+def _note_token_version(user_id: str, version: int):
+    """Raise the minimum accepted token version for a user"""
+    if version > token_versions.get(user_id, 0):
+        token_versions[user_id] = version
+
+
+async def _load_user(token: str, use_cache: bool = True, use_claims: bool = False, scope=None) -> dict:
+    """
+    Decode the JWT and resolve the user.
+    
+    With the request's scope, the claims the middlewares already verified are reused.
+    
+    With use_claims, a stateless token whose version is still current is trusted
+    without touching the database; the result then only carries _id, uuid and preferences.
+    A user this process has no version for yet (after a restart, or on another
+    worker) is loaded authoritatively first, so stale claims are never taken on trust.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+    if scope is not None:
+        payload = token_payload(scope)
+        if payload is None:
             raise credentials_exception
-    except JWTError:
+    else:
+        try:
+            with span("auth.jwt"):
+                payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        except JWTError:
+            raise credentials_exception
+    user_id: str = payload.get("sub")
+    if user_id is None:
         raise credentials_exception
     
+    if use_claims and "ver" in payload and payload.get("uuid"):
+        if user_id in token_versions and payload["ver"] >= token_versions[user_id]:
+            try:
+                return {
+                    "_id": ObjectId(user_id),
+                    "uuid": payload["uuid"],
+                    "preferences": payload.get("prefs") or {},
+                    "claims_only": True
+                }
+            except Exception:
+                raise credentials_exception
+        # Stale or not yet checked preferences claim: fall through to an authoritative load
+    
+    if use_cache:
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            # Deep copy so handlers can't mutate the cached document (preferences, stats, ...)
+            return copy.deepcopy(cached)
+    
     db = await get_database()
     
     try:
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
+        with span("db.user_lookup"):
+            user = await db.users.find_one({"_id": ObjectId(user_id)})
     except:
         user = None
         
     if user is None:
+        user_cache.invalidate(user_id)
         raise credentials_exception
         
     if "uuid" not in user or not user["uuid"]:
@@ -120,8 +211,29 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             {"$set": {"uuid": new_uuid}}
         )
         user["uuid"] = new_uuid
-        
-    return user
+    
+    _note_token_version(user_id, user.get("prefs_version", 0))
+    user_cache.set(user_id, user)
+    return copy.deepcopy(user)
+
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
+    """
+    Get current authenticated user.
+    
+    Only _id, uuid and preferences are guaranteed; stateless tokens skip the database entirely.
+    """
+    return await _load_user(token, use_cache=True, use_claims=True, scope=request.scope)
+
+
+async def get_full_user(request: Request, token: str = Depends(oauth2_scheme)):
+    """Get the complete user document (served from the user cache when fresh)"""
+    return await _load_user(token, use_cache=True, scope=request.scope)
+
+
+async def get_current_user_uncached(request: Request, token: str = Depends(oauth2_scheme)):
+    """Get current authenticated user straight from the database, for sensitive operations"""
+    return await _load_user(token, use_cache=False, scope=request.scope)
 
 
 @router.post("/register", response_model=Token)
@@ -145,15 +257,12 @@ async def register(user_data: UserCreate):
         preferences=UserPreferences()
     )
     user_dict = user.model_dump(by_alias=True, exclude={"id"})
-    user_dict["password_hash"] = get_password_hash(user_data.password)
+    user_dict["password_hash"] = await run_password_task(get_password_hash, user_data.password)
     
     result = await db.users.insert_one(user_dict)
     
     # Create access token
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": str(result.inserted_id)}, expires_delta=access_token_expires
-    )
+    access_token = create_user_token({**user_dict, "_id": result.inserted_id})
     
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -175,41 +284,52 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     if "password_hash" not in user:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     
-    if not verify_password(form_data.password, user["password_hash"]):
+    if not await run_password_task(verify_password, form_data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": str(user["_id"])}, expires_delta=access_token_expires
-    )
+    access_token = create_user_token(user)
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: dict = Depends(get_current_user)):
+async def get_current_user_info(current_user: dict = Depends(get_full_user)):
     """Get current user info"""
     return {
         "id": str(current_user["_id"]),
         "uuid": current_user.get("uuid", ""),
         "email": current_user["email"],
         "preferences": current_user.get("preferences", {}),
-        "stats": current_user.get("stats", {})
+        "stats": stats_buffer.merge_stats(current_user["_id"], current_user.get("stats", {}))
     }
 
 
 @router.put("/profile")
 async def update_profile(
     preferences: UserPreferences,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user_uncached)
 ):
     """Update user preferences"""
     db = await get_database()
     
-    await db.users.update_one(
+    # Bumping prefs_version makes every previously issued stateless token stale
+    user = await db.users.find_one_and_update(
         {"_id": current_user["_id"]},
-        {"$set": {"preferences": preferences.model_dump()}}
+        {
+            "$set": {"preferences": preferences.model_dump()},
+            "$inc": {"prefs_version": 1}
+        },
+        return_document=ReturnDocument.AFTER
     )
+    user_id = str(current_user["_id"])
+    user_cache.invalidate(user_id)
+    
+    response = {"message": "Profile updated successfully"}
+    if user:
+        _note_token_version(user_id, user.get("prefs_version", 0))
+        if settings.stateless_tokens:
+            # Hand back a token carrying the new preferences so the client can swap it in
+            response.update({"access_token": create_user_token(user), "token_type": "bearer"})
     
-    return {"message": "Profile updated successfully"}
+    return response
 
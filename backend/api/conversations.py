@@ -1,76 +1,115 @@
 """Conversation management endpoints"""
 
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Header
 from typing import Optional, List
 from bson import ObjectId
 from datetime import datetime
 
 from database import get_database
 from api.auth import get_current_user
+from utils.etag import collection_version, make_etag, match_etag, not_modified, tagged_response
+from utils.fields import FieldSelection, sparse_fields
+from utils.responses import FastJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
+
+# Screenshots are embedded as base64; the popup never needs them in listings
+SLIM_EXCLUDE = ("screenshots.image_data",)
 
 
 @router.get("/")
 async def list_conversations(
     limit: int = 20,
     skip: int = 0,
+    selection: FieldSelection = Depends(sparse_fields(SLIM_EXCLUDE)),
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
-    """List user's conversations"""
+    """
+    List user's conversations.
+    
+    Carries an ETag over the user's conversation and analysis versions. A
+    matching If-None-Match is answered with 304 before the list is loaded;
+    without one, the version lookup runs alongside loading the list.
+    """
     
     db = await get_database()
     user_uuid = current_user.get("uuid")
     
-    conversations = await db.conversations.find(
-        {"user_id": user_uuid}
-    ).sort("updated_at", -1).skip(skip).limit(limit).to_list(length=limit)
+    async def list_etag() -> str:
+        # Cards show the latest analysis, so new or enriched analyses change the list too
+        versions = await asyncio.gather(
+            collection_version(db.conversations, {"user_id": user_uuid}),
+            collection_version(db.analyses, {"user_id": user_uuid})
+        )
+        return make_etag("conversations", user_uuid, limit, skip, selection.key, *versions[0], *versions[1])
     
-    for conv in conversations:
-        conv["id"] = str(conv["_id"])
-        # user_id is already uuid string, no need to convert
+    async def load_conversations() -> list:
+        conversations = await db.conversations.find(
+            {"user_id": user_uuid},
+            selection.projection
+        ).sort("updated_at", -1).skip(skip).limit(limit).to_list(length=limit)
         
-        # Remove _id to avoid serialization issues
-        if "_id" in conv:
-            del conv["_id"]
+        for conv in conversations:
+            conv["id"] = str(conv["_id"])
+            # user_id is already uuid string, no need to convert
             
-        # Get latest analysis if exists (support both ObjectId and string conversation_id)
-        latest_analysis = None
-        try:
-            latest_analysis = await db.analyses.find_one(
-                {"conversation_id": ObjectId(conv["id"])},
-                sort=[("timestamp", -1)]
-            )
-        except Exception:
-            pass
-        if not latest_analysis:
-            latest_analysis = await db.analyses.find_one(
-                {"conversation_id": conv["id"]},
-                sort=[("timestamp", -1)]
-            )
-        if latest_analysis:
-            conv["latest_interest_score"] = latest_analysis.get("interest_score")
-            conv["latest_analysis_id"] = str(latest_analysis["_id"])
-        else:
-            conv["latest_interest_score"] = None
-            conv["latest_analysis_id"] = None
-    
-    return conversations
+            # Remove _id to avoid serialization issues
+            if "_id" in conv:
+                del conv["_id"]
+                
+            # Get latest analysis if exists (support both ObjectId and string conversation_id)
+            latest_analysis = None
+            try:
+                latest_analysis = await db.analyses.find_one(
+                    {"conversation_id": ObjectId(conv["id"])},
+                    {"interest_score": 1},
+                    sort=[("timestamp", -1)]
+                )
+            except Exception:
+                pass
+            if not latest_analysis:
+                latest_analysis = await db.analyses.find_one(
+                    {"conversation_id": conv["id"]},
+                    {"interest_score": 1},
+                    sort=[("timestamp", -1)]
+                )
+            if latest_analysis:
+                conv["latest_interest_score"] = latest_analysis.get("interest_score")
+                conv["latest_analysis_id"] = str(latest_analysis["_id"])
+            else:
+                conv["latest_interest_score"] = None
+                conv["latest_analysis_id"] = None
+        return conversations
+    
+    if if_none_match:
+        etag = await list_etag()
+        matched = match_etag(if_none_match, etag)
+        if matched:
+            return not_modified(matched)
+        conversations = await load_conversations()
+    else:
+        # Nothing to compare yet: the ETag only labels the response, so don't wait for it first
+        conversations, etag = await asyncio.gather(load_conversations(), list_etag())
+    
+    return tagged_response(conversations, etag)
 
 
 @router.get("/{conversation_id}")
 async def get_conversation(
     conversation_id: str,
+    selection: FieldSelection = Depends(sparse_fields(SLIM_EXCLUDE, required=("user_id",))),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get specific conversation"""
+    """Get specific conversation; pass fields=* to include screenshot image data"""
     
     db = await get_database()
     user_uuid = current_user.get("uuid")
     
     try:
         conv_obj_id = ObjectId(conversation_id)
-        conversation = await db.conversations.find_one({"_id": conv_obj_id})
+        conversation = await db.conversations.find_one({"_id": conv_obj_id}, selection.projection)
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
         if conversation["user_id"] != user_uuid:
@@ -81,7 +120,7 @@ async def get_conversation(
         if "_id" in conversation:
             del conversation["_id"]
             
-        return conversation
+        return selection.trim(conversation)
     except HTTPException:
         raise
     except:
@@ -182,16 +221,17 @@ async def delete_conversation(
 @router.get("/{conversation_id}/timeline")
 async def get_conversation_timeline(
     conversation_id: str,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get interest score timeline for conversation"""
+    """Get interest score timeline for conversation; ETag/304 like the list"""
     
     db = await get_database()
     user_uuid = current_user.get("uuid")
     
     try:
         conv_obj_id = ObjectId(conversation_id)
-        conversation = await db.conversations.find_one({"_id": conv_obj_id})
+        conversation = await db.conversations.find_one({"_id": conv_obj_id}, {"user_id": 1})
         if not conversation or conversation["user_id"] != user_uuid:
             raise HTTPException(status_code=404, detail="Conversation not found")
     except HTTPException:
@@ -199,9 +239,17 @@ async def get_conversation_timeline(
     except:
         raise HTTPException(status_code=400, detail="Invalid conversation ID")
     
+    # Analyses store conversation_id as a string; match ObjectIds from older documents too
+    match = {"conversation_id": {"$in": [conv_obj_id, str(conv_obj_id)]}}
+    etag = make_etag("timeline", conversation_id, *await collection_version(db.analyses, match))
+    matched = match_etag(if_none_match, etag)
+    if matched:
+        return not_modified(matched)
+    
     # Get all analyses for this conversation
     analyses = await db.analyses.find(
-        {"conversation_id": conv_obj_id}
+        match,
+        {"timestamp": 1, "interest_score": 1}
     ).sort("timestamp", 1).to_list(length=100)
     
     timeline = [
@@ -213,5 +261,4 @@ async def get_conversation_timeline(
         for analysis in analyses
     ]
     
-    return {"timeline": timeline}
-
+    return tagged_response({"timeline": timeline}, etag)
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from services.osint_service import OsintService
-from services.ai_service import AIService
+from services.osint_jobs import osint_jobs, QueueFull
+from services.providers import get_osint_service
+from services.handle_candidates import generate_candidates
 from api.auth import get_current_user
+from utils.helpers import format_sse
+from utils.priority import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from utils.responses import FastJSONRoute
 
-router = APIRouter()
-osint_service = OsintService()
-ai_service = AIService()
+router = APIRouter(route_class=FastJSONRoute)
 
 class OsintRequest(BaseModel):
     conversation_id: str
@@ -18,24 +22,110 @@ class OsintResult(BaseModel):
     found_accounts: List[dict]
     risk_level: str # low, medium, high based on findings
 
+class OsintJobRequest(BaseModel):
+    username: str
+    priority: Literal["interactive", "background"] = "interactive"
+
+
+def _queue_full(e: QueueFull) -> HTTPException:
+    """503 telling the client when the OSINT queue should have room again"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="OSINT scans are busy, please retry shortly",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+def _owned_job(job_id: str, current_user: dict):
+    """Look up a job the current user submitted, or 404"""
+    job = osint_jobs.get(job_id)
+    if job is None or current_user.get("uuid") not in job.owners:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.post("/check/{username}")
-async def check_username(username: str, current_user: dict = Depends(get_current_user)):
+async def check_username(
+    username: str,
+    current_user: dict = Depends(get_current_user),
+    osint_service: OsintService = Depends(get_osint_service)
+):
     """Direct OSINT check for a username"""
     try:
         results = await osint_service.check_username(username)
         return results
+    except QueueFull as e:
+        raise _queue_full(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/check/{username}/stream")
+async def stream_username_check(
+    username: str,
+    current_user: dict = Depends(get_current_user),
+    osint_service: OsintService = Depends(get_osint_service)
+):
+    """
+    OSINT check streamed as Server-Sent Events.
+    
+    Emits `account` for each confirmed profile, `summary` when its page preview
+    is ready, and a final `done` (or `error`) event with the complete result.
+    """
+    async def event_stream():
+        try:
+            async for event in osint_service.stream_username(username):
+                yield format_sse(event["event"], event["data"])
+        except QueueFull as e:
+            yield format_sse("error", {"error": str(e), "retry_after": e.retry_after})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    request: OsintJobRequest,
+    current_user: dict = Depends(get_current_user),
+    osint_service: OsintService = Depends(get_osint_service)
+):
+    """
+    Queue an OSINT scan and return its job id without waiting.
+    
+    Poll `GET /jobs/{job_id}` for status and `GET /jobs/{job_id}/result` for the
+    result. Answers 503 with Retry-After when the queue sheds the job.
+    """
+    priority = PRIORITY_BACKGROUND if request.priority == "background" else PRIORITY_INTERACTIVE
+    try:
+        job = await osint_service.submit_scan(request.username, priority)
+    except QueueFull as e:
+        raise _queue_full(e)
+    job.owners.add(current_user.get("uuid"))
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Status of a queued OSINT scan"""
+    return _owned_job(job_id, current_user).to_dict()
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Result of a finished OSINT scan; 409 while it is still queued or running"""
+    job = _owned_job(job_id, current_user)
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return {**job.to_dict(), "result": job.result}
+
 @router.post("/analyze_context")
 async def analyze_context_for_osint(
     request: OsintRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    osint_service: OsintService = Depends(get_osint_service)
 ):
     """
     1. Fetch conversation
     2. Use LLM to extract potential OSINT targets (usernames, emails)
-    3. Run OSINT check on best candidate
+    3. Run OSINT checks on the likely handles
     """
     from database import get_database
     from bson import ObjectId
@@ -60,16 +150,12 @@ async def analyze_context_for_osint(
     if not target_username or target_username == "Unknown":
         return {"message": "No target username found in conversation metadata"}
         
-    # Clean username (remove @, spaces)
-    clean_username = target_username.replace("@", "").strip()
-    if " " in clean_username:
-        # If name has spaces (e.g. "John Doe"), it's likely a display name, not a username.
-        # We could try to guess, but for OSINT we really need a handle.
-        # Let's try to use LLM to guess a handle or return early.
-        return {"message": "Participant name appears to be a full name, not a username. OSINT skipped."}
-
-    # Run OSINT
-    osint_results = await osint_service.check_username(clean_username)
+    # Display names (e.g. "John Doe") expand into likely handles (johndoe, john.doe, jdoe, ...)
+    candidates = generate_candidates(display_name=target_username)
+    if not candidates:
+        return {"message": "Could not derive a username from the participant name. OSINT skipped."}
+    
+    # Run OSINT across all candidates within one time budget
+    osint_results = await osint_service.check_candidates(candidates)
     
     return osint_results
-
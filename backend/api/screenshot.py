@@ -9,8 +9,22 @@ from database import get_database
 from database.schemas import ScreenshotData, ScreenshotMetadata
 from api.auth import get_current_user
 from services.image_processor import ImageProcessor
+from utils.responses import FastJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
+
+
+def screenshot_entry(image_data: str, processed: dict) -> dict:
+    """The element pushed onto a conversation's screenshots array"""
+    return {
+        "id": ObjectId(),
+        "image_data": image_data,
+        "uploaded_at": datetime.utcnow(),
+        "metadata": {
+            "width": processed.get("width"),
+            "height": processed.get("height")
+        } if processed.get("width") else None
+    }
 
 
 @router.post("/upload")
@@ -64,14 +78,7 @@ async def upload_screenshot(
         conv_obj_id = result.inserted_id
     
     # Add screenshot to conversation
-    screenshot_data = {
-        "image_data": base64.b64encode(image_bytes).decode('utf-8'),
-        "uploaded_at": datetime.utcnow(),
-        "metadata": {
-            "width": processed.get("width"),
-            "height": processed.get("height")
-        } if processed.get("width") else None
-    }
+    screenshot_data = screenshot_entry(base64.b64encode(image_bytes).decode('utf-8'), processed)
     
     await db.conversations.update_one(
         {"_id": conv_obj_id},
@@ -83,7 +90,7 @@ async def upload_screenshot(
     
     return {
         "conversation_id": str(conv_obj_id),
-        "screenshot_id": str(ObjectId()),  # Generate ID for reference
+        "screenshot_id": str(screenshot_data["id"]),
         "message": "Screenshot uploaded successfully"
     }
 
@@ -8,10 +8,15 @@ from pydantic import BaseModel
 from database import get_database
 from database.schemas import Analysis
 from api.auth import get_current_user
+from api.analysis import ai_busy
+from services.ai_admission import use_ai_caller, AIOverloaded
+from services.providers import get_ai_service
 from services.wingman_service import WingmanService
 from services.analysis_engine import AnalysisEngine
+from services.stats_buffer import stats_buffer
+from utils.responses import FastJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 
 class ReplyRequest(BaseModel):
@@ -22,13 +27,12 @@ class ReplyRequest(BaseModel):
 @router.post("/suggest-reply")
 async def suggest_reply(
     request: ReplyRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    ai_service=Depends(get_ai_service)
 ):
     """Get AI-generated reply suggestions"""
     
-    from services.ai_service import AIService
-    ai_service = AIService()
-    
+    use_ai_caller(current_user.get("uuid"))
     user_preferences = current_user.get("preferences", {})
     
     try:
@@ -37,6 +41,8 @@ async def suggest_reply(
             user_preferences
         )
         return {"suggestions": suggestions}
+    except AIOverloaded as e:
+        raise ai_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate replies: {str(e)}")
 
@@ -68,10 +74,7 @@ async def reality_check(
     reality_check = await service.get_reality_check(analysis, user_preferences)
     
     # Update intervention stats
-    await db.users.update_one(
-        {"_id": user_id},
-        {"$inc": {"stats.overthinking_interventions": 1}}
-    )
+    stats_buffer.increment(user_id, "overthinking_interventions")
     
     return reality_check
 
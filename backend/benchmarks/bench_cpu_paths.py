@@ -0,0 +1,196 @@
+"""
+Microbenchmarks for the pure-CPU steps every upload/analyze request runs.
+
+Cases (realistic inputs: phone-sized PNG screenshots, fixture model output):
+    b64encode          base64 of the upload, as api/screenshot.py stores it
+    b64decode          utils.helpers.decode_base64_image, as analyze reads it back
+    pil_verify         utils.helpers.validate_image_format
+    pil_dimensions     utils.helpers.get_image_dimensions
+    process_screenshot ImageProcessor.process_screenshot end to end
+    ai_json[_fenced|_prose]  services.ai_service.parse_analysis_content
+    process_ai_response      AnalysisEngine.process_ai_response
+    text_to_analysis_legacy  parse_analysis_content + process_ai_response (dict, then models)
+    text_to_analysis         AnalysisEngine.parse_model_output (orjson + one model_validate)
+    analysis_from_doc        Analysis(**doc) on a stored analysis, as api/wingman.py does
+    respond_<payload>[_default]  response body rendering with FastJSONResponse, or with
+                             FastAPI's default jsonable_encoder + JSONResponse, for an
+                             analysis, 20 analyses and a conversation with 3 screenshots
+
+Reports median/p95 time per call and peak traced allocations of one call.
+Save a run with --output and compare later runs with --baseline.
+
+Run from the backend directory:
+    python -m benchmarks.bench_cpu_paths --runs 200
+    python -m benchmarks.bench_cpu_paths --only ai_json,process_ai_response --baseline cpu-before.json
+"""
+
+import argparse
+import asyncio
+import atexit
+import base64
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.fake_openai import FIXTURES_DIR
+from benchmarks.helpers import percentile
+from benchmarks.loadtest import make_screenshot
+from database.schemas import Analysis
+from services.ai_service import parse_analysis_content
+from services.analysis_engine import AnalysisEngine
+from services.image_processor import ImageProcessor
+from utils.helpers import decode_base64_image, get_image_dimensions, validate_image_format
+from utils.responses import FastJSONResponse
+
+
+def load_raw_response() -> str:
+    with open(f"{FIXTURES_DIR}/analysis.json", "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def build_cases(width: int, height: int) -> List[Tuple[str, Callable[[], object]]]:
+    image_bytes = make_screenshot(width, height, seed=1)
+    image_b64 = base64.b64encode(image_bytes).decode("utf-8")
+    data_url = f"data:image/png;base64,{image_b64}"
+
+    raw = load_raw_response()
+    fenced = f"```json\n{raw}\n```"
+    prose = f"Here is the analysis you asked for:\n\n{raw}\n\nLet me know if you need anything else."
+    ai_response = parse_analysis_content(fenced)
+
+    analysis = AnalysisEngine.process_ai_response(ai_response, str(ObjectId()), "bench-user-uuid")
+    stored = analysis.model_dump(by_alias=True, exclude={"id"})
+    stored["_id"] = ObjectId()
+
+    # API payloads as the GET endpoints return them (ids already stringified,
+    # since the default encoder can't handle ObjectId)
+    analysis_payload = {key: value for key, value in stored.items() if key != "_id"}
+    analysis_payload["id"] = str(stored["_id"])
+    analyses_payload = [dict(analysis_payload) for _ in range(20)]
+    conversation_payload = {
+        "id": str(ObjectId()),
+        "user_id": "bench-user-uuid",
+        "platform": "iMessage",
+        "participant_name": "Tyler",
+        "screenshots": [
+            {"image_data": image_b64, "uploaded_at": datetime.utcnow(), "metadata": {"width": width, "height": height}}
+            for _ in range(3)
+        ],
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+    payloads = {"analysis": analysis_payload, "analyses": analyses_payload, "conversation": conversation_payload}
+
+    # One loop for every run so loop setup isn't billed to process_screenshot
+    loop = asyncio.new_event_loop()
+    atexit.register(loop.close)
+
+    return [
+        ("b64encode", lambda: base64.b64encode(image_bytes).decode("utf-8")),
+        ("b64decode", lambda: decode_base64_image(data_url)),
+        ("pil_verify", lambda: validate_image_format(image_bytes)),
+        ("pil_dimensions", lambda: get_image_dimensions(image_bytes)),
+        ("process_screenshot", lambda: loop.run_until_complete(ImageProcessor.process_screenshot(image_b64))),
+        ("ai_json", lambda: parse_analysis_content(raw)),
+        ("ai_json_fenced", lambda: parse_analysis_content(fenced)),
+        ("ai_json_prose", lambda: parse_analysis_content(prose)),
+        ("process_ai_response", lambda: AnalysisEngine.process_ai_response(
+            ai_response, stored["conversation_id"], "bench-user-uuid"
+        )),
+        ("text_to_analysis_legacy", lambda: AnalysisEngine.process_ai_response(
+            parse_analysis_content(fenced), stored["conversation_id"], "bench-user-uuid"
+        )),
+        ("text_to_analysis", lambda: AnalysisEngine.parse_model_output(
+            fenced, stored["conversation_id"], "bench-user-uuid"
+        )),
+        ("analysis_from_doc", lambda: Analysis(**stored)),
+    ] + [
+        case
+        for name, payload in payloads.items()
+        for case in (
+            (f"respond_{name}_default", lambda payload=payload: JSONResponse(jsonable_encoder(payload)).body),
+            (f"respond_{name}", lambda payload=payload: FastJSONResponse(payload).body),
+        )
+    ]
+
+
+def measure(fn: Callable[[], object], runs: int, warmup: int) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+
+    # Allocation tracing slows everything down, so measure it on a separate call
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_us": round(statistics.median(samples), 2),
+        "p95_us": round(percentile(samples, 95), 2),
+        "min_us": round(min(samples), 2),
+        "peak_kib": round(peak / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--image-size", default="1170x2532", help="screenshot size, WIDTHxHEIGHT")
+    parser.add_argument("--only", default="", help="comma-separated case names")
+    parser.add_argument("--output", default="", help="write results as JSON")
+    parser.add_argument("--baseline", default="", help="earlier --output file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed median increase (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.image_size.split("x"))
+    selected = {name.strip() for name in args.only.split(",") if name.strip()}
+    results = {}
+    for name, fn in build_cases(width, height):
+        if not selected or name in selected:
+            results[name] = measure(fn, args.runs, args.warmup)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    print(f"{'case':<28} {'median us':>11} {'p95 us':>11} {'min us':>11} {'peak KiB':>10} {'vs base':>8}")
+    regressions = []
+    for name, result in results.items():
+        delta = ""
+        before = baseline.get(name)
+        if before and before["median_us"]:
+            change = (result["median_us"] - before["median_us"]) / before["median_us"]
+            delta = f"{change:+.1%}"
+            if change > args.max_regression:
+                regressions.append(f"{name} {before['median_us']:.1f}us -> {result['median_us']:.1f}us ({delta})")
+        print(f"{name:<28} {result['median_us']:>11.1f} {result['p95_us']:>11.1f} "
+              f"{result['min_us']:>11.1f} {result['peak_kib']:>10.1f} {delta:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"image_size": args.image_size, "runs": args.runs, "results": results}, f, indent=2)
+
+    if regressions:
+        print("REGRESSION: " + "; ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Measure cold-start import time of the app and fail when it exceeds a budget.
+
+Each run imports `main` in a fresh interpreter. The script exits non-zero if the
+median import time goes over --budget-ms, or if a module that should load lazily
+(the OpenAI SDK, daphne, Pillow) is imported at startup.
+
+Run from the backend directory:
+    python -m benchmarks.bench_import_time --runs 5 --budget-ms 2000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed on specific request paths or when launched via `python main.py`
+LAZY_MODULES = ("openai", "daphne", "PIL")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+lazy = [name for name in {lazy!r} if name in sys.modules]
+print(json.dumps({{"import_ms": elapsed * 1000, "eager_lazy_modules": lazy}}))
+"""
+
+IMPORTTIME_PROBE = "import main"
+
+
+def run_once() -> dict:
+    """Import main in a fresh interpreter and report its import time"""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(lazy=LAZY_MODULES)],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(count: int) -> list:
+    """Top-level modules by cumulative import time, from `python -X importtime`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORTTIME_PROBE],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split(":", 1)[1].split("|")
+        # Names are indented two spaces per nesting level; one level means imported directly by `main`
+        name = name[1:]
+        if name.startswith("  ") and not name.startswith("    "):
+            rows.append((name.strip(), int(cumulative_us) / 1000))
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return [{"module": name, "cumulative_ms": round(ms, 1)} for name, ms in rows[:count]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=2000.0)
+    parser.add_argument("--top", type=int, default=8, help="slowest imports of main to list")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    samples = [run["import_ms"] for run in runs]
+    eager = sorted({name for run in runs for name in run["eager_lazy_modules"]})
+    median_ms = statistics.median(samples)
+
+    report = {
+        "runs": args.runs,
+        "median_ms": round(median_ms, 1),
+        "max_ms": round(max(samples), 1),
+        "budget_ms": args.budget_ms,
+        "eager_lazy_modules": eager,
+        "slowest_imports": slowest_imports(args.top)
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"median import time {median_ms:.0f}ms exceeds budget {args.budget_ms:.0f}ms")
+    if eager:
+        failures.append(f"modules that should load lazily were imported at startup: {', '.join(eager)}")
+    if failures:
+        print("FAIL: " + "; ".join(failures), file=sys.stderr)
+        sys.exit(1)
+    print("OK: within import budget")
+
+
+if __name__ == "__main__":
+    main()
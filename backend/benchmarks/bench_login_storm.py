@@ -0,0 +1,101 @@
+"""
+Login storm load test: bcrypt on the event loop vs. the bounded password executor.
+
+A burst of concurrent logins runs while a probe coroutine plays the role of other
+endpoints, measuring how long it waits for the loop every few milliseconds.
+
+Run from the backend directory:
+    python -m benchmarks.bench_login_storm --logins 64 --probe-interval-ms 10
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+import api.auth as auth
+from benchmarks.helpers import FakeUsers, fake_database, patched, percentile
+
+
+PASSWORD = "correct horse battery staple"
+
+
+class InlineExecutor:
+    """Baseline: runs the callable directly on the event loop like the old code"""
+
+    async def run(self, fn, *args):
+        return fn(*args)
+
+
+async def probe(stop: asyncio.Event, interval: float, samples: list):
+    """Record how late the loop wakes us up compared with the requested interval"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def run(logins: int, interval: float, offload: bool) -> dict:
+    user = {
+        "_id": ObjectId(),
+        "uuid": "bench-uuid",
+        "email": "bench@example.com",
+        "password_hash": auth.get_password_hash(PASSWORD)
+    }
+    patches = {"get_database": fake_database(FakeUsers(user))}
+    if not offload:
+        patches["password_executor"] = InlineExecutor()
+
+    form = SimpleNamespace(username=user["email"], password=PASSWORD)
+    stop = asyncio.Event()
+    lag = []
+    rejected = 0
+
+    async def one_login():
+        nonlocal rejected
+        try:
+            await auth.login(form)
+        except HTTPException as e:
+            if e.status_code != 503:
+                raise
+            rejected += 1
+
+    with patched(auth, **patches):
+        probe_task = asyncio.create_task(probe(stop, interval, lag))
+        start = time.perf_counter()
+        await asyncio.gather(*(one_login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        await probe_task
+
+    return {
+        "mode": "executor" if offload else "inline",
+        "logins": logins,
+        "rejected": rejected,
+        "logins_per_s": round((logins - rejected) / elapsed, 2),
+        "probe_lag_p50_ms": round(percentile(lag, 50), 2) if lag else None,
+        "probe_lag_p99_ms": round(percentile(lag, 99), 2) if lag else None,
+        "probe_lag_max_ms": round(max(lag), 2) if lag else None,
+        "probe_samples": len(lag),
+        "probe_lag_mean_ms": round(statistics.mean(lag), 2) if lag else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--probe-interval-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    interval = args.probe_interval_ms / 1000
+    for offload in (False, True):
+        print(asyncio.run(run(args.logins, interval, offload)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark get_current_user per-request latency with and without the user cache.
+
+Run from the backend directory:
+    python -m benchmarks.bench_user_cache --requests 2000 --db-latency-ms 2
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from bson import ObjectId
+
+import api.auth as auth
+from benchmarks.helpers import FakeUsers, fake_database, patched, percentile
+
+
+async def run(requests: int, latency: float, use_cache: bool) -> dict:
+    user = {"_id": ObjectId(), "uuid": "bench-uuid", "email": "bench@example.com", "preferences": {}, "stats": {}}
+    users = FakeUsers(user, latency)
+    auth.user_cache.clear()
+    auth.user_cache.hits = auth.user_cache.misses = 0
+    token = auth.create_access_token({"sub": str(user["_id"])})
+
+    samples = []
+    with patched(auth, get_database=fake_database(users)):
+        for _ in range(requests):
+            start = time.perf_counter()
+            await auth._load_user(token, use_cache=use_cache)
+            samples.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "mode": "cached" if use_cache else "uncached",
+        "db_reads": users.reads,
+        "mean_ms": round(statistics.mean(samples), 4),
+        "p50_ms": round(percentile(samples, 50), 4),
+        "p99_ms": round(percentile(samples, 99), 4),
+        "cache": auth.user_cache.stats() if use_cache else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    latency = args.db_latency_ms / 1000
+    for use_cache in (False, True):
+        print(asyncio.run(run(args.requests, latency, use_cache)))
+
+
+if __name__ == "__main__":
+    main()
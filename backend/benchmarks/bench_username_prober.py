@@ -0,0 +1,89 @@
+"""
+Scan-time benchmark for UsernameProber against a local stub of the profile sites.
+
+The stub answers 200 for /<site>/<known username> and 404 otherwise, after an
+artificial latency, so no real site is contacted.
+
+Run from the backend directory:
+    python -m benchmarks.bench_username_prober --sites 300 --latency-ms 150
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from services.username_prober import UsernameProber
+
+KNOWN_USERNAME = "sherlock_bench"
+
+
+def start_stub_server(latency: float, found_every: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            _, site, username = self.path.split("/", 2)
+            exists = username == KNOWN_USERNAME and int(site[4:]) % found_every == 0
+            body = b"<html><body>profile</body></html>" if exists else b"not found"
+            self.send_response(200 if exists else 404)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        # The socketserver default backlog of 5 would serialize the fan-out
+        request_queue_size = 256
+
+    server = Server(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run(site_count: int, concurrency: int) -> dict:
+    prober = UsernameProber(
+        [
+            {"name": f"site{i}", "url": f"http://127.0.0.1:{PORT}/site{i}/{{username}}", "error_message": None}
+            for i in range(site_count)
+        ],
+        concurrency=concurrency,
+        # Every stub site shares one host, so lift the per-host cap to measure raw fan-out
+        per_host=concurrency,
+        scan_timeout=600
+    )
+    scan = await prober.probe(KNOWN_USERNAME)
+    return {
+        "sites": site_count,
+        "concurrency": concurrency,
+        "found": len(scan["found_accounts"]),
+        "checked": scan["sites_checked"],
+        "timed_out": scan["sites_timed_out"],
+        "elapsed_ms": scan["elapsed_ms"]
+    }
+
+
+def main():
+    global PORT
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--found-every", type=int, default=25)
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency_ms / 1000, args.found_every)
+    PORT = server.server_address[1]
+    try:
+        for concurrency in (1, 10, 50):
+            print(asyncio.run(run(args.sites, concurrency)))
+    finally:
+        server.shutdown()
+
+
+PORT = 0
+
+if __name__ == "__main__":
+    main()
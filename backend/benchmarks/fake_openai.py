@@ -0,0 +1,149 @@
+"""
+Minimal OpenAI-compatible chat completions server for load tests.
+
+Answers POST /chat/completions (and /v1/chat/completions) after a configurable
+latency with a fixture chosen from the prompt: reply suggestions, profile
+metadata, or a full screenshot analysis. Token usage is estimated from the
+request and fixture sizes so token metrics move realistically.
+
+Run standalone from the backend directory:
+    python -m benchmarks.fake_openai --port 8900 --latency-ms 800 --jitter-ms 200
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures(directory: str = FIXTURES_DIR) -> Dict[str, str]:
+    """Fixture name (analysis, metadata, reply) -> model output text"""
+    fixtures = {}
+    for name in ("analysis", "metadata", "reply"):
+        with open(os.path.join(directory, f"{name}.json"), "r", encoding="utf-8") as f:
+            fixtures[name] = f.read()
+    return fixtures
+
+
+def pick_fixture(body: dict) -> str:
+    """Which canned answer fits this request, judged from the prompt text"""
+    text = json.dumps(body.get("messages", []))
+    if "reply suggestions" in text:
+        return "reply"
+    if "identifying information" in text:
+        return "metadata"
+    return "analysis"
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    # The socketserver default backlog of 5 would serialize concurrent calls
+    request_queue_size = 256
+    daemon_threads = True
+
+    def __init__(self, address, latency: float, jitter: float, fixtures: Dict[str, str], error_rate: float = 0.0):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.fixtures = fixtures
+        self.error_rate = error_rate
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def count(self, fixture: str):
+        with self._lock:
+            self.calls[fixture] = self.calls.get(fixture, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeOpenAIServer
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        body = json.loads(raw or b"{}")
+        fixture = pick_fixture(body)
+        self.server.count(fixture)
+        time.sleep(max(0.0, self.server.latency + random.uniform(-self.server.jitter, self.server.jitter)))
+
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self._send(500, {"error": {"message": "injected upstream failure", "type": "server_error"}})
+            return
+
+        content = self.server.fixtures[fixture]
+        # Rough tokenizer stand-in: ~4 bytes per token; images are billed as a flat 765 tokens
+        prompt_tokens = len(raw) // 4 if b"image_url" not in raw else 765 + len(json.dumps(body.get("messages", [])[:1])) // 4
+        completion_tokens = len(content) // 4
+        self._send(200, {
+            "id": f"chatcmpl-fake-{random.getrandbits(48):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_openai(
+    latency: float = 0.8,
+    jitter: float = 0.2,
+    port: int = 0,
+    fixtures_dir: Optional[str] = None,
+    error_rate: float = 0.0
+) -> FakeOpenAIServer:
+    """Start the server on a background thread; base URL is http://127.0.0.1:<server.server_port>"""
+    server = FakeOpenAIServer(
+        ("127.0.0.1", port), latency, jitter, load_fixtures(fixtures_dir or FIXTURES_DIR), error_rate
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter-ms", type=float, default=200.0)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="directory with analysis/metadata/reply.json")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with HTTP 500")
+    args = parser.parse_args()
+
+    server = start_fake_openai(args.latency_ms / 1000, args.jitter_ms / 1000, args.port, args.fixtures, args.error_rate)
+    print(f"Fake OpenAI listening on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
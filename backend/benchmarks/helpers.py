@@ -0,0 +1,60 @@
+"""Shared pieces of the in-process benchmarks: percentiles, a fake users collection, patching"""
+
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class FakeUsers:
+    """Stand-in for the users collection holding one user, with a fixed round-trip latency"""
+
+    def __init__(self, user: dict, latency: float = 0.0):
+        self.user = user
+        self.latency = latency
+        self.reads = 0
+
+    async def find_one(self, query: dict, *args, **kwargs) -> Optional[dict]:
+        self.reads += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if all(self.user.get(field) == value for field, value in query.items()):
+            return dict(self.user)
+        return None
+
+    async def update_one(self, *args, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeDatabase:
+    def __init__(self, users: FakeUsers):
+        self.users = users
+
+
+@contextmanager
+def patched(target: Any, **attributes: Any) -> Iterator[None]:
+    """Set attributes on a module or object for the duration of the block, then restore them"""
+    originals = {name: getattr(target, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(target, name, value)
+
+
+def fake_database(users: FakeUsers):
+    """An async get_database replacement returning a FakeDatabase around users"""
+    database = FakeDatabase(users)
+
+    async def get_database():
+        return database
+
+    return get_database
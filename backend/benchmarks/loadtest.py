@@ -0,0 +1,380 @@
+"""
+End-to-end load test: main:app under daphne, a fake OpenAI-compatible server and
+an in-memory MongoDB stand-in (or a real mongod via --mongodb-url).
+
+Each virtual user registers, then loops over a weighted mix of requests:
+    upload   POST /api/screenshot/upload (phone-sized PNG)
+    analyze  POST /api/analyze/
+    list     GET  /api/conversations/
+    wingman  POST /api/wingman/suggest-reply
+and the run reports throughput and p50/p95/p99 latency per endpoint, plus mean
+server-side stage times scraped from /metrics. Results are written as JSON;
+pass --baseline with an earlier result to flag p95 regressions (exit code 1).
+
+Run from the backend directory:
+    python -m benchmarks.loadtest --duration 60 --concurrency 16 --model-latency-ms 800
+    python -m benchmarks.loadtest --baseline benchmarks/results/loadtest-20250101-120000.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_openai import FIXTURES_DIR, start_fake_openai
+from benchmarks.helpers import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+DEFAULT_MIX = "upload=2,analyze=3,list=4,wingman=1"
+PASSWORD = "loadtest-password"
+# Start a fresh conversation after this many uploads so documents stay phone-realistic
+SCREENSHOTS_PER_CONVERSATION = 5
+
+REPLY_CONTEXT = (
+    "Them: haha that hike looked brutal, did you make it to the top?\n"
+    "Me: barely!! my legs are still mad at me\n"
+    "Them: we should go together sometime, I know an easier one"
+)
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"Unknown operation in --mix: {name!r} (choose from {', '.join(OPERATIONS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def make_screenshot(width: int, height: int, seed: int) -> bytes:
+    """A chat-like PNG: light background with alternating message bubbles"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (245, 245, 247))
+    draw = ImageDraw.Draw(image)
+    y = height // 12
+    while y < height - height // 10:
+        bubble_h = rng.randint(height // 40, height // 14)
+        bubble_w = rng.randint(width // 3, int(width * 0.75))
+        mine = rng.random() < 0.5
+        x0 = width - bubble_w - width // 20 if mine else width // 20
+        color = (0, 122, 255) if mine else (229, 229, 234)
+        draw.rounded_rectangle([x0, y, x0 + bubble_w, y + bubble_h], radius=bubble_h // 3, fill=color)
+        # Fake text lines so the PNG does not compress to nothing
+        for line_y in range(y + 12, y + bubble_h - 12, 28):
+            for x in range(x0 + 16, x0 + bubble_w - 24, rng.randint(9, 13)):
+                shade = 255 if mine else 20
+                draw.rectangle([x, line_y, x + rng.randint(3, 8), line_y + 14], fill=(shade, shade, shade))
+        y += bubble_h + rng.randint(height // 80, height // 30)
+    # A shared photo: incompressible pixels bring the PNG to a real screenshot's size (~1 MB)
+    photo_w, photo_h = width // 2, height // 6
+    photo = Image.frombytes("RGB", (photo_w, photo_h), rng.randbytes(photo_w * photo_h * 3))
+    image.paste(photo, (width // 20, height // 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, email: str):
+        self.client = client
+        self.email = email
+        self.headers: Dict[str, str] = {}
+        self.conversation_id: Optional[str] = None
+        self.screenshots = 0
+
+    async def register(self):
+        response = await self.client.post("/api/auth/register", json={"email": self.email, "password": PASSWORD})
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def op_upload(user: VirtualUser, image: bytes) -> httpx.Response:
+    data = {"platform": "iMessage", "participant_name": "Tyler"}
+    if user.conversation_id and user.screenshots < SCREENSHOTS_PER_CONVERSATION:
+        data["conversation_id"] = user.conversation_id
+    response = await user.client.post(
+        "/api/screenshot/upload",
+        headers=user.headers,
+        data=data,
+        files={"image": ("screenshot.png", image, "image/png")}
+    )
+    if response.status_code == 200:
+        conversation_id = response.json()["conversation_id"]
+        user.screenshots = user.screenshots + 1 if conversation_id == user.conversation_id else 1
+        user.conversation_id = conversation_id
+    return response
+
+
+async def op_analyze(user: VirtualUser, image: bytes) -> httpx.Response:
+    if not user.conversation_id:
+        return await op_upload(user, image)
+    return await user.client.post(
+        "/api/analyze/",
+        headers=user.headers,
+        json={"conversation_id": user.conversation_id, "screenshot_index": user.screenshots - 1}
+    )
+
+
+async def op_list(user: VirtualUser, image: bytes) -> httpx.Response:
+    return await user.client.get("/api/conversations/", headers=user.headers, params={"limit": 20})
+
+
+async def op_wingman(user: VirtualUser, image: bytes) -> httpx.Response:
+    return await user.client.post(
+        "/api/wingman/suggest-reply",
+        headers=user.headers,
+        json={"conversation_context": REPLY_CONTEXT}
+    )
+
+
+OPERATIONS = {"upload": op_upload, "analyze": op_analyze, "list": op_list, "wingman": op_wingman}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(port: int, openai_url: str, args) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_BASE_URL": openai_url,
+        "OPENAI_API_KEY": "loadtest",
+        "SECRET_KEY": "loadtest-secret",
+        "RATE_LIMIT_ENABLED": "false",
+        "OSINT_CACHE_ENABLED": "false",
+        "PYTHONUNBUFFERED": "1",
+    })
+    if args.mongodb_url:
+        env["MONGODB_URL"] = args.mongodb_url
+        env["MONGODB_DB_NAME"] = args.mongodb_db or f"loadtest_{uuid.uuid4().hex[:8]}"
+    else:
+        env["MONGODB_URL"] = ""
+        env["LOADTEST_MEMORY_DB"] = "1"
+        env["LOADTEST_DB_LATENCY_MS"] = str(args.db_latency_ms)
+    return subprocess.Popen(
+        [sys.executable, "-m", "daphne", "-b", "127.0.0.1", "-p", str(port), "benchmarks.loadtest_app:app"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL if not args.server_logs else None,
+        stderr=subprocess.DEVNULL if not args.server_logs else None
+    )
+
+
+async def wait_until_healthy(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"App exited during startup with code {process.returncode} (rerun with --server-logs)")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit("App did not become healthy in time")
+
+
+def parse_stage_means(metrics_text: str) -> Dict[str, Dict[str, float]]:
+    """Mean and count per stage from sherlock_stage_duration_seconds"""
+    sums: Dict[str, float] = {}
+    counts: Dict[str, float] = {}
+    for match in re.finditer(r'^sherlock_stage_duration_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$', metrics_text, re.M):
+        kind, stage, value = match.groups()
+        (sums if kind == "sum" else counts)[stage] = float(value)
+    return {
+        stage: {"count": int(counts[stage]), "mean_ms": round(sums[stage] / counts[stage] * 1000, 2)}
+        for stage in sorted(counts) if counts[stage]
+    }
+
+
+def summarize(samples: List[float], errors: int, elapsed: float, statuses: Dict[str, int]) -> dict:
+    if not samples:
+        return {"requests": 0, "errors": errors, "statuses": statuses}
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "statuses": statuses,
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "mean_ms": round(statistics.mean(samples), 2),
+        "p50_ms": round(percentile(samples, 50), 2),
+        "p95_ms": round(percentile(samples, 95), 2),
+        "p99_ms": round(percentile(samples, 99), 2),
+        "max_ms": round(max(samples), 2)
+    }
+
+
+async def run(args) -> dict:
+    mix = parse_mix(args.mix)
+    fake = start_fake_openai(args.model_latency_ms / 1000, args.model_jitter_ms / 1000, fixtures_dir=args.fixtures)
+    port = args.port or free_port()
+    process = start_app(port, f"http://127.0.0.1:{fake.server_port}", args)
+    width, height = (int(v) for v in args.image_size.split("x"))
+    images = [make_screenshot(width, height, seed) for seed in range(4)]
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    timeout = httpx.Timeout(args.request_timeout)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=timeout) as client:
+            await wait_until_healthy(client, process)
+
+            run_id = uuid.uuid4().hex[:8]
+            users = [VirtualUser(client, f"loadtest-{run_id}-{i}@example.com") for i in range(args.users)]
+            for user in users:
+                await user.register()
+                await op_upload(user, images[0])
+
+            records: List[tuple] = []  # (operation, status, latency_ms, measured)
+            names, weights = zip(*mix.items())
+            start = time.monotonic()
+            measure_from = start + args.warmup
+            stop_at = measure_from + args.duration
+
+            async def worker(index: int):
+                user = users[index % len(users)]
+                rng = random.Random(index)
+                while time.monotonic() < stop_at:
+                    name = rng.choices(names, weights)[0]
+                    began = time.monotonic()
+                    try:
+                        response = await OPERATIONS[name](user, images[rng.randrange(len(images))])
+                        status = str(response.status_code)
+                    except httpx.HTTPError as e:
+                        status = type(e).__name__
+                    ended = time.monotonic()
+                    records.append((name, status, (ended - began) * 1000, began >= measure_from))
+
+            await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+            elapsed = time.monotonic() - measure_from
+            metrics_text = (await client.get("/metrics")).text
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        fake.shutdown()
+
+    endpoints = {}
+    measured = [record for record in records if record[3]]
+    for name in names:
+        rows = [record for record in measured if record[0] == name]
+        ok = [latency for _, status, latency, _ in rows if status.startswith("2")]
+        statuses: Dict[str, int] = {}
+        for _, status, _, _ in rows:
+            statuses[status] = statuses.get(status, 0) + 1
+        endpoints[name] = summarize(ok, len(rows) - len(ok), elapsed, statuses)
+    all_ok = [latency for _, status, latency, _ in measured if status.startswith("2")]
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "database": "mongod" if args.mongodb_url else "memory",
+            "settings": {
+                "duration_s": args.duration,
+                "warmup_s": args.warmup,
+                "concurrency": args.concurrency,
+                "users": args.users,
+                "mix": mix,
+                "model_latency_ms": args.model_latency_ms,
+                "model_jitter_ms": args.model_jitter_ms,
+                "db_latency_ms": None if args.mongodb_url else args.db_latency_ms,
+                "image_size": args.image_size,
+                "image_bytes": len(images[0])
+            }
+        },
+        "overall": summarize(all_ok, len(measured) - len(all_ok), elapsed, {}),
+        "endpoints": endpoints,
+        "server_stages": parse_stage_means(metrics_text),
+        "upstream_calls": dict(fake.calls)
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Print per-endpoint deltas against a baseline; return the regressions"""
+    regressions = []
+    print(f"\n{'endpoint':<10} {'p95 base':>10} {'p95 now':>10} {'delta':>8} {'rps base':>9} {'rps now':>9}")
+    for name, now in report["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before or not before.get("requests") or not now.get("requests"):
+            continue
+        delta = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        print(f"{name:<10} {before['p95_ms']:>10.1f} {now['p95_ms']:>10.1f} {delta:>+8.1%} "
+              f"{before['throughput_rps']:>9.2f} {now['throughput_rps']:>9.2f}")
+        if delta > max_regression:
+            regressions.append(f"{name} p95 {before['p95_ms']:.1f}ms -> {now['p95_ms']:.1f}ms ({delta:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of traffic excluded from the results")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent virtual users (closed loop)")
+    parser.add_argument("--users", type=int, default=8, help="distinct accounts shared by the workers")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--model-latency-ms", type=float, default=800.0)
+    parser.add_argument("--model-jitter-ms", type=float, default=200.0)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="model response fixtures directory")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="per-call latency of the in-memory database")
+    parser.add_argument("--mongodb-url", default="", help="use this mongod instead of the in-memory stand-in")
+    parser.add_argument("--mongodb-db", default="", help="database name on --mongodb-url (default: a fresh loadtest_*)")
+    parser.add_argument("--image-size", default="1170x2532", help="uploaded screenshot size, WIDTHxHEIGHT")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--server-logs", action="store_true", help="show the app's stdout/stderr")
+    parser.add_argument("--output", default="", help="result file (default: benchmarks/results/loadtest-<time>.json)")
+    parser.add_argument("--baseline", default="", help="earlier result file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 increase vs baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"loadtest-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps({"overall": report["overall"], "endpoints": report["endpoints"]}, indent=2))
+    print(f"Saved {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_regression)
+        if regressions:
+            print("REGRESSION: " + "; ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
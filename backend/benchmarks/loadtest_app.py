@@ -0,0 +1,30 @@
+"""
+ASGI entry point used by the load-test harness: main:app wired to test stand-ins.
+
+Configured from the environment by benchmarks.loadtest:
+    LOADTEST_MEMORY_DB=1        serve MongoDB calls from benchmarks.memory_mongo
+    LOADTEST_DB_LATENCY_MS=2    per-call latency of the in-memory database
+plus the usual settings (OPENAI_BASE_URL, MONGODB_URL, RATE_LIMIT_ENABLED, ...).
+"""
+
+import os
+
+from config import settings
+
+if os.environ.get("LOADTEST_MEMORY_DB") == "1":
+    import database
+    import database.mongodb as mongodb
+    from benchmarks.memory_mongo import MemoryDatabase
+
+    # Never fall through to a real cluster configured in .env
+    settings.mongodb_url = ""
+    mongodb.database = MemoryDatabase(latency=float(os.environ.get("LOADTEST_DB_LATENCY_MS", "0")) / 1000)
+
+    async def _init_memory_database():
+        await mongodb.ensure_indexes(mongodb.database)
+
+    # main imports init_database from the package, so patch it before main is imported
+    database.init_database = _init_memory_database
+    mongodb.init_database = _init_memory_database
+
+from main import app  # noqa: E402
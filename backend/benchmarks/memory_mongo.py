@@ -0,0 +1,474 @@
+"""
+In-memory stand-in for the subset of the motor API the backend uses.
+
+Good enough to drive the app end to end in load tests without a mongod:
+equality and operator filters ($in, $nin, $ne, $gt/$gte/$lt/$lte, $exists),
+dotted paths, sort/skip/limit, simple projections, $set/$unset/$inc/$push/
+$setOnInsert updates, upserts, bulk_write of UpdateOne and aggregation
+pipelines of $match/$group/$sort/$limit/$project. An optional per-call
+latency mimics a network round trip. Indexes, TTLs and transactions are ignored.
+"""
+
+import asyncio
+import copy
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+_MISSING = object()
+
+
+def _get_path(doc: Dict[str, Any], path: str) -> Any:
+    value: Any = doc
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return _MISSING
+    return value
+
+
+def _set_path(doc: Dict[str, Any], path: str, value: Any):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _unset_path(doc: Dict[str, Any], path: str):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _compare(value: Any, op: str, operand: Any) -> bool:
+    if op == "$in":
+        return (value in operand) if value is not _MISSING else None in operand
+    if op == "$nin":
+        return value not in operand
+    if op == "$ne":
+        return value != operand
+    if op == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if value is _MISSING or value is None:
+        return False
+    if op == "$gt":
+        return value > operand
+    if op == "$gte":
+        return value >= operand
+    if op == "$lt":
+        return value < operand
+    if op == "$lte":
+        return value <= operand
+    raise NotImplementedError(f"memory_mongo: unsupported operator {op}")
+
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    for key, condition in (query or {}).items():
+        value = _get_path(doc, key)
+        if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif isinstance(value, list) and not isinstance(condition, list):
+            if condition not in value:
+                return False
+        elif (None if value is _MISSING else value) != condition:
+            return False
+    return True
+
+
+def _exclude_path(doc: Dict[str, Any], path: str):
+    """Drop a projected-out path, descending into arrays like MongoDB does"""
+    head, _, rest = path.partition(".")
+    if not rest:
+        doc.pop(head, None)
+        return
+    value = doc.get(head)
+    for item in value if isinstance(value, list) else [value]:
+        if isinstance(item, dict):
+            _exclude_path(item, rest)
+
+
+def _include_path(source: Dict[str, Any], target: Dict[str, Any], path: str):
+    """Copy a projected-in path, descending into arrays like MongoDB does"""
+    head, _, rest = path.partition(".")
+    if head not in source:
+        return
+    value = source[head]
+    if not rest:
+        target[head] = copy.deepcopy(value)
+    elif isinstance(value, dict):
+        _include_path(value, target.setdefault(head, {}), rest)
+    elif isinstance(value, list):
+        items = target.setdefault(head, [{} for item in value if isinstance(item, dict)])
+        for item, projected in zip((item for item in value if isinstance(item, dict)), items):
+            _include_path(item, projected, rest)
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Any]) -> Dict[str, Any]:
+    if not projection:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        result = {}
+        if projection.get("_id", 1):
+            result["_id"] = doc.get("_id")
+        for path in include:
+            _include_path(doc, result, path)
+        return result
+    result = copy.deepcopy(doc)
+    for path, flag in projection.items():
+        if not flag:
+            _exclude_path(result, path)
+    return result
+
+
+def _normalize_sort(key_or_list, direction=None) -> List[Tuple[str, int]]:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    return list(key_or_list)
+
+
+def _sorted(docs: List[Dict[str, Any]], spec: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    """Multi-key sort; missing fields sort first like MongoDB's null"""
+    def key_for(field):
+        def key(doc):
+            value = _get_path(doc, field)
+            return (False, 0) if value is _MISSING or value is None else (True, value)
+        return key
+
+    # Python's sort is stable, so applying keys last to first gives a compound order
+    for field, direction in reversed(spec):
+        docs = sorted(docs, key=key_for(field), reverse=direction < 0)
+    return docs
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class UpdateResult:
+    def __init__(self, matched: int, modified: int, upserted_id=None):
+        self.matched_count = matched
+        self.modified_count = modified
+        self.upserted_id = upserted_id
+
+
+class DeleteResult:
+    def __init__(self, deleted: int):
+        self.deleted_count = deleted
+
+
+class BulkWriteResult:
+    def __init__(self, matched: int, modified: int, upserted: int):
+        self.matched_count = matched
+        self.modified_count = modified
+        self.upserted_count = upserted
+
+
+class MemoryCursor:
+    def __init__(self, collection: "MemoryCollection", query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None) -> "MemoryCursor":
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, count: int) -> "MemoryCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "MemoryCursor":
+        self._limit = count
+        return self
+
+    def _results(self) -> List[Dict[str, Any]]:
+        docs = [doc for doc in self._collection._docs.values() if matches(doc, self._query)]
+        if self._sort:
+            docs = _sorted(docs, self._sort)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [_project(copy.deepcopy(doc), self._projection) for doc in docs]
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        await self._collection._delay()
+        docs = self._results()
+        return docs[:length] if length else docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await self._collection._delay()
+        for doc in self._results():
+            yield doc
+
+
+def _evaluate(doc: Dict[str, Any], expression: Any) -> Any:
+    """Aggregation expressions: "$field" paths, $ifNull and literals"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = _get_path(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict) and "$ifNull" in expression:
+        for candidate in expression["$ifNull"]:
+            value = _evaluate(doc, candidate)
+            if value is not None:
+                return value
+        return None
+    return expression
+
+
+def _group(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for doc in docs:
+        groups.setdefault(_evaluate(doc, spec["_id"]), []).append(doc)
+    results = []
+    for key, members in groups.items():
+        result = {"_id": key}
+        for name, accumulator in spec.items():
+            if name == "_id":
+                continue
+            (op, expression), = accumulator.items()
+            values = [_evaluate(doc, expression) for doc in members]
+            present = [value for value in values if value is not None]
+            if op == "$sum":
+                result[name] = sum(values)
+            elif op == "$max":
+                result[name] = max(present) if present else None
+            elif op == "$min":
+                result[name] = min(present) if present else None
+            else:
+                raise NotImplementedError(f"memory_mongo: unsupported accumulator {op}")
+        results.append(result)
+    return results
+
+
+class MemoryAggregateCursor:
+    def __init__(self, collection: "MemoryCollection", pipeline: List[Dict[str, Any]]):
+        self._collection = collection
+        self._pipeline = pipeline
+
+    def _results(self) -> List[Dict[str, Any]]:
+        docs = [copy.deepcopy(doc) for doc in self._collection._docs.values()]
+        for stage in self._pipeline:
+            (op, spec), = stage.items()
+            if op == "$match":
+                docs = [doc for doc in docs if matches(doc, spec)]
+            elif op == "$group":
+                docs = _group(docs, spec)
+            elif op == "$sort":
+                docs = _sorted(docs, list(spec.items()))
+            elif op == "$limit":
+                docs = docs[:spec]
+            elif op == "$project":
+                docs = [_project(doc, spec) for doc in docs]
+            else:
+                raise NotImplementedError(f"memory_mongo: unsupported pipeline stage {op}")
+        return docs
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        await self._collection._delay()
+        docs = self._results()
+        return docs[:length] if length else docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await self._collection._delay()
+        for doc in self._results():
+            yield doc
+
+
+class MemoryCollection:
+    def __init__(self, name: str, latency: float = 0.0):
+        self.name = name
+        self.latency = latency
+        self._docs: Dict[Any, Dict[str, Any]] = {}
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _find(self, query) -> Iterable[Dict[str, Any]]:
+        if query and set(query) == {"_id"} and not isinstance(query["_id"], dict):
+            doc = self._docs.get(query["_id"])
+            return [doc] if doc is not None else []
+        return [doc for doc in self._docs.values() if matches(doc, query)]
+
+    def _first(self, query, sort=None) -> Optional[Dict[str, Any]]:
+        docs = list(self._find(query))
+        if sort:
+            docs = _sorted(docs, _normalize_sort(sort))
+        return docs[0] if docs else None
+
+    @staticmethod
+    def _apply_update(doc: Dict[str, Any], update: Dict[str, Any], inserting: bool = False):
+        if not any(key.startswith("$") for key in update):
+            # Replacement document
+            doc_id = doc.get("_id")
+            doc.clear()
+            doc.update(copy.deepcopy(update))
+            doc["_id"] = doc_id
+            return
+        for op, fields in update.items():
+            for path, value in fields.items():
+                if op == "$set" or (op == "$setOnInsert" and inserting):
+                    _set_path(doc, path, copy.deepcopy(value))
+                elif op == "$unset":
+                    _unset_path(doc, path)
+                elif op == "$inc":
+                    current = _get_path(doc, path)
+                    _set_path(doc, path, (0 if current is _MISSING else current) + value)
+                elif op == "$push":
+                    current = _get_path(doc, path)
+                    if current is _MISSING:
+                        current = []
+                        _set_path(doc, path, current)
+                    if isinstance(value, dict) and "$each" in value:
+                        current.extend(copy.deepcopy(value["$each"]))
+                    else:
+                        current.append(copy.deepcopy(value))
+                elif op == "$setOnInsert":
+                    continue
+                else:
+                    raise NotImplementedError(f"memory_mongo: unsupported update operator {op}")
+
+    def _upsert_doc(self, query: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+        doc = {k: copy.deepcopy(v) for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+        doc.setdefault("_id", ObjectId())
+        self._apply_update(doc, update, inserting=True)
+        self._docs[doc["_id"]] = doc
+        return doc
+
+    async def create_index(self, *args, **kwargs) -> str:
+        return "memory_index"
+
+    async def insert_one(self, document: Dict[str, Any]) -> InsertOneResult:
+        await self._delay()
+        if "_id" not in document:
+            document["_id"] = ObjectId()  # motor sets _id on the caller's dict too
+        if document["_id"] in self._docs:
+            raise DuplicateKeyError(f"memory_mongo: duplicate key {document['_id']} in {self.name}")
+        self._docs[document["_id"]] = copy.deepcopy(document)
+        return InsertOneResult(document["_id"])
+
+    async def find_one(self, query=None, projection=None, sort=None, **kwargs) -> Optional[Dict[str, Any]]:
+        await self._delay()
+        doc = self._first(query, sort)
+        return _project(copy.deepcopy(doc), projection) if doc is not None else None
+
+    def find(self, query=None, projection=None, **kwargs) -> MemoryCursor:
+        return MemoryCursor(self, query, projection)
+
+    def aggregate(self, pipeline, **kwargs) -> MemoryAggregateCursor:
+        return MemoryAggregateCursor(self, pipeline)
+
+    async def count_documents(self, query=None, **kwargs) -> int:
+        await self._delay()
+        return len(list(self._find(query)))
+
+    async def update_one(self, query, update, upsert: bool = False, **kwargs) -> UpdateResult:
+        await self._delay()
+        doc = self._first(query)
+        if doc is None:
+            if upsert:
+                created = self._upsert_doc(query, update)
+                return UpdateResult(0, 0, created["_id"])
+            return UpdateResult(0, 0)
+        self._apply_update(doc, update)
+        return UpdateResult(1, 1)
+
+    async def update_many(self, query, update, upsert: bool = False, **kwargs) -> UpdateResult:
+        await self._delay()
+        docs = list(self._find(query))
+        for doc in docs:
+            self._apply_update(doc, update)
+        if not docs and upsert:
+            created = self._upsert_doc(query, update)
+            return UpdateResult(0, 0, created["_id"])
+        return UpdateResult(len(docs), len(docs))
+
+    async def replace_one(self, query, replacement, upsert: bool = False, **kwargs) -> UpdateResult:
+        return await self.update_one(query, replacement, upsert=upsert)
+
+    async def find_one_and_update(
+        self, query, update, projection=None, sort=None, upsert: bool = False,
+        return_document=ReturnDocument.BEFORE, **kwargs
+    ) -> Optional[Dict[str, Any]]:
+        await self._delay()
+        if isinstance(update, list):
+            raise NotImplementedError("memory_mongo: aggregation pipeline updates are not supported")
+        doc = self._first(query, sort)
+        if doc is None:
+            if not upsert:
+                return None
+            doc = self._upsert_doc(query, update)
+            return _project(copy.deepcopy(doc), projection) if return_document == ReturnDocument.AFTER else None
+        before = copy.deepcopy(doc)
+        self._apply_update(doc, update)
+        result = doc if return_document == ReturnDocument.AFTER else before
+        return _project(copy.deepcopy(result), projection)
+
+    async def delete_one(self, query, **kwargs) -> DeleteResult:
+        await self._delay()
+        doc = self._first(query)
+        if doc is None:
+            return DeleteResult(0)
+        del self._docs[doc["_id"]]
+        return DeleteResult(1)
+
+    async def delete_many(self, query, **kwargs) -> DeleteResult:
+        await self._delay()
+        ids = [doc["_id"] for doc in self._find(query)]
+        for doc_id in ids:
+            del self._docs[doc_id]
+        return DeleteResult(len(ids))
+
+    async def bulk_write(self, requests, ordered: bool = True, **kwargs) -> BulkWriteResult:
+        await self._delay()
+        matched = upserted = 0
+        for request in requests:
+            # pymongo's UpdateOne keeps its arguments in private attributes
+            query, update, upsert = request._filter, request._doc, request._upsert
+            doc = self._first(query)
+            if doc is not None:
+                self._apply_update(doc, update)
+                matched += 1
+            elif upsert:
+                self._upsert_doc(query, update)
+                upserted += 1
+        return BulkWriteResult(matched, matched, upserted)
+
+
+class MemoryDatabase:
+    """Collections are created on first access, like MongoDB"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MemoryCollection(name, self.latency)
+        return collection
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -25,13 +25,78 @@ class Settings(BaseSettings):
     secret_key: str = ""
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 10080
+    # Embed uuid/preferences claims in tokens so most requests skip the user lookup
+    stateless_tokens: bool = False
+    # Password hashing pool (0 = one worker per CPU core / 8 queued per worker)
+    password_hash_workers: int = 0
+    password_hash_max_pending: int = 0
     
     # CORS - can be JSON array string or comma-separated string
     allowed_origins: List[str] = ["chrome-extension://*"]
     
+    # OSINT username prober
+    tookie_base_path: str = ""  # Tookie-OSINT checkout; defaults to backend/tookie-osint
+    osint_sites_file: str = ""  # defaults to <tookie_base_path>/sites/fsites.json
+    osint_probe_concurrency: int = 50
+    osint_probe_per_host: int = 2
+    osint_probe_timeout: float = 5.0
+    osint_scan_timeout: float = 20.0
+    osint_breaker_threshold: int = 5  # consecutive errors before a site is skipped
+    osint_breaker_cooldown: float = 300.0
+    osint_good_enough_found: int = 0  # stop after this many high-confidence profiles (0 = scan all)
+    osint_good_enough_budget: float = 0.0  # stop after this many seconds (0 = scan timeout only)
+    osint_max_candidates: int = 6  # handles guessed from names/metadata per lookup
+    osint_candidates_budget: float = 30.0  # overall seconds for a multi-handle lookup
+    osint_workers: int = 4  # scans running at once; each fans out up to osint_probe_concurrency probes
+    osint_queue_max: int = 100  # waiting scans before new ones are shed
+    osint_queue_background_max: int = 20  # waiting background scans before new background ones are shed
+    osint_job_retention: float = 3600.0  # seconds a finished job's status and result stay queryable
+    analysis_deadline: float = 40.0  # seconds an analyze request may take before returning a partial result
+    analysis_model_reserve: float = 15.0  # part of the deadline kept for the enriched model call
+    
+    # Admission control for upstream model calls
+    ai_max_concurrency: int = 8  # model calls in flight at once per worker
+    ai_max_queued_per_user: int = 4  # waiting calls per user before more of theirs are shed
+    ai_queue_slo_interactive: float = 15.0  # max seconds an interactive call may wait for a slot
+    ai_queue_slo_background: float = 120.0  # same for background work (deadline-cut enrichments)
+    osint_fetch_concurrency: int = 32  # page preview fetches across all scans
+    osint_fetch_max_bytes: int = 262144  # stop reading a profile page after this many bytes
+    osint_summary_chars: int = 200
+    
+    # Shared outbound HTTP connection pool
+    http_max_connections: int = 200
+    http_max_keepalive: int = 50
+    
+    # OSINT result cache (seconds)
+    osint_cache_enabled: bool = True
+    osint_cache_positive_ttl: int = 86400
+    osint_cache_negative_ttl: int = 3600
+    osint_cache_stale_ttl: int = 86400
+    osint_cache_stale_while_revalidate: bool = True
+    osint_cache_site_ttls: Dict[str, int] = {}  # host -> max age, e.g. {"www.instagram.com": 3600}
+    
+    # Response compression (gzip, per Accept-Encoding)
+    gzip_minimum_size: int = 1024
+    gzip_level: int = 5
+    
     # Rate Limiting
     rate_limit_requests: int = 100
     rate_limit_period: int = 60
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"  # memory (per worker) or mongo (shared)
+    
+    # Idempotency-Key replay for upload/analyze POSTs (seconds)
+    idempotency_enabled: bool = True
+    idempotency_ttl: int = 86400  # how long a finished response is replayed
+    idempotency_lock_ttl: int = 300  # lease on a key whose request is still running
+    idempotency_wait: float = 120.0  # how long a repeat waits on the running request
+    
+    # User stats write coalescing (seconds between bulk flushes)
+    stats_flush_interval: float = 5.0
+    
+    # Authenticated user document cache
+    user_cache_size: int = 10000
+    user_cache_ttl: float = 30.0
     
     @field_validator('allowed_origins', mode='before')
     @classmethod
@@ -23,6 +23,7 @@ async def init_database():
         # Test connection
         await client.admin.command('ping')
         logger.info("Connected to MongoDB successfully")
+        await ensure_indexes(database)
     except ValueError as e:
         logger.error(str(e))
         raise
@@ -32,6 +33,18 @@ async def init_database():
         raise ValueError(error_msg) from e
 
 
+async def ensure_indexes(db):
+    """Create the indexes per-user and per-conversation reads rely on (no-op if they exist)"""
+    try:
+        # Conversation lists and the ETag version lookups (utils.etag.collection_version)
+        await db.conversations.create_index([("user_id", 1), ("updated_at", -1)])
+        await db.analyses.create_index([("user_id", 1), ("timestamp", -1)])
+        await db.analyses.create_index([("conversation_id", 1), ("timestamp", -1)])
+    except Exception as e:
+        # Reads still work without them, just slower
+        logger.warning(f"Failed to create indexes: {e}")
+
+
 async def get_database():
     """Get database instance"""
     if database is None:
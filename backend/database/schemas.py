@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field, ConfigDict, GetJsonSchemaHandler
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, GetJsonSchemaHandler, field_validator
 from pydantic.json_schema import JsonSchemaValue
 from pydantic_core import core_schema
 from typing import Optional, List, Dict, Any, Annotated
@@ -67,6 +67,7 @@ class ScreenshotMetadata(BaseModel):
 
 
 class ScreenshotData(BaseModel):
+    id: Optional[PyObjectId] = None
     image_data: str  # base64 or URL
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
     metadata: Optional[ScreenshotMetadata] = None
@@ -131,6 +132,10 @@ class Analysis(BaseModel):
     wingman_notes: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     raw_ai_response: Optional[str] = None
+    # Set when the request deadline cut enrichments short; "pending" until the
+    # background run finishes, then "complete"
+    skipped_enrichments: List[str] = []
+    enrichment_status: Optional[str] = None
 
     model_config = ConfigDict(
         populate_by_name=True,
@@ -139,6 +144,64 @@ class Analysis(BaseModel):
     )
 
 
+# Model output: the analysis JSON the vision model returns, validated straight
+# into an Analysis. Missing fields get the defaults AnalysisEngine applies.
+class ModelVibeReport(VibeReport):
+    overall_mood: str = "neutral"
+    engagement_level: str = "medium"
+    communication_style: str = "secure"
+    emotional_temperature: float = 5.0
+
+
+class ModelRedFlag(Flag):
+    type: str = "unknown"
+    severity: Optional[str] = "low"
+    evidence: str = ""
+    detected_at: Optional[datetime] = None  # set to the analysis timestamp
+
+    @field_validator("significance", mode="before")
+    @classmethod
+    def _no_significance(cls, value):
+        return None  # only green flags carry a significance
+
+
+class ModelGreenFlag(Flag):
+    type: str = "unknown"
+    significance: Optional[str] = "medium"
+    evidence: str = ""
+    detected_at: Optional[datetime] = None
+
+    @field_validator("severity", mode="before")
+    @classmethod
+    def _no_severity(cls, value):
+        return None  # only red flags carry a severity
+
+
+class ModelPowerDynamics(PowerDynamics):
+    leader: str = "balanced"
+
+
+class ModelSuggestedReply(SuggestedReply):
+    text: str = ""
+    tone: str = "direct"
+    success_probability: float = 0.5
+
+
+class ModelAnalysis(Analysis):
+    interest_score: int = 50
+    vibe_report: ModelVibeReport = Field(default_factory=ModelVibeReport)
+    # default_factory, not [], so pydantic doesn't deepcopy a default per field
+    red_flags: List[ModelRedFlag] = Field(default_factory=list)
+    green_flags: List[ModelGreenFlag] = Field(default_factory=list)
+    power_dynamics: ModelPowerDynamics = Field(default_factory=ModelPowerDynamics)
+    suggested_replies: List[ModelSuggestedReply] = Field(default_factory=list)
+    skipped_enrichments: List[str] = Field(default_factory=list)
+    wingman_notes: str = "Keep the conversation going!"
+    # Conversation metadata the model also reports; not part of the stored analysis
+    platform: Optional[str] = Field(default=None, exclude=True)
+    participant_name: Optional[str] = Field(default=None, exclude=True)
+
+
 # User Profile Models
 class UserProfile(BaseModel):
     id: Optional[PyObjectId] = Field(default=None, alias="_id")
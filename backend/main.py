@@ -7,15 +7,25 @@ if sys.platform == 'win32':
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
-import asyncio
-from daphne.cli import CommandLineInterface
 import logging
 
 from config import settings
 from api import auth, screenshot, analysis, wingman, conversations, osint
 from database import init_database
+from services.stats_buffer import stats_buffer
+from services.osint_cache import osint_cache
+from services.osint_jobs import osint_jobs
+from services.ai_admission import ai_admission
+from services.http_client import close_http_client
+from services.site_stats import site_stats
+from middleware.rate_limit import RateLimitMiddleware, rate_limit_metrics
+from middleware.idempotency import IdempotencyMiddleware, idempotency_metrics
+from middleware.compression import CompressionMiddleware
+from middleware.timing import TimingMiddleware
+from utils.metrics import registry
+from utils.responses import FastJSONResponse, FastJSONRoute
 
 logger = logging.getLogger(__name__)
 
@@ -30,9 +40,16 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"Database initialization failed: {e}. Server will start but database operations will fail until MONGODB_URL is configured.")
     
+    stats_buffer.start()
+    osint_jobs.start()
+    
     yield
     
-    # Shutdown (if needed)
+    # Shutdown: make sure buffered stats counters reach the database
+    await stats_buffer.stop()
+    await osint_jobs.stop()
+    auth.password_executor.shutdown()
+    await close_http_client()
     # await close_database()
 
 
@@ -40,8 +57,17 @@ app = FastAPI(
     title="Screenshot Sherlock API",
     description="AI-powered text conversation analysis wingman",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
+# Routes declared on the app itself (/, /health) also skip jsonable_encoder
+app.router.route_class = FastJSONRoute
+
+# Rate limiting (added before CORS so 429 responses still carry CORS headers)
+app.add_middleware(RateLimitMiddleware)
+
+# Idempotency-Key replay; outside rate limiting so a replayed retry costs no tokens
+app.add_middleware(IdempotencyMiddleware)
 
 # CORS middleware
 app.add_middleware(
@@ -50,8 +76,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "Idempotent-Replayed"],
 )
 
+# gzip large bodies; inside timing so the histograms include compression time
+app.add_middleware(CompressionMiddleware, minimum_size=settings.gzip_minimum_size, level=settings.gzip_level)
+
+# Outermost, so Server-Timing and latency histograms cover every other layer
+app.add_middleware(TimingMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(screenshot.router, prefix="/api/screenshot", tags=["Screenshot"])
@@ -68,9 +101,77 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "caches": {"users": auth.user_cache.stats(), "osint": osint_cache.stats()},
+        "rate_limit": rate_limit_metrics.stats(),
+        "idempotency": idempotency_metrics.stats(),
+        "osint_sites": site_stats.stats(),
+        "osint_jobs": osint_jobs.stats(),
+        "ai_admission": ai_admission.stats()
+    }
+
+
+def _cache_series():
+    series = {}
+    for name, stats in (("users", auth.user_cache.stats()), ("osint", osint_cache.stats())):
+        series[(("cache", name), ("result", "hit"))] = stats["hits"]
+        series[(("cache", name), ("result", "miss"))] = stats["misses"]
+    return series
+
+
+def _cache_ratio_series():
+    return {
+        (("cache", "users"),): auth.user_cache.stats()["hit_ratio"],
+        (("cache", "osint"),): osint_cache.stats()["hit_ratio"],
+    }
+
+
+def _queue_series():
+    jobs = osint_jobs.stats()
+    return {
+        (("queue", "osint_jobs"), ("state", "queued")): jobs["queued"],
+        (("queue", "osint_jobs"), ("state", "running")): jobs["running"],
+        (("queue", "ai"), ("state", "queued")): ai_admission.queued,
+        (("queue", "ai"), ("state", "running")): ai_admission.running,
+        (("queue", "password_hash"), ("state", "pending")): auth.password_executor.pending,
+        (("queue", "stats_buffer"), ("state", "pending")): stats_buffer.stats()["pending_users"],
+        (("queue", "enrichment"), ("state", "running")): len(analysis._background_tasks),
+    }
+
+
+def _shed_series():
+    return {
+        (("source", "rate_limit"),): rate_limit_metrics.stats()["limited"],
+        (("source", "osint_jobs"),): osint_jobs.stats()["shed"],
+        (("source", "ai_admission"),): ai_admission.shed + ai_admission.timed_out,
+        (("source", "password_hash"),): auth.password_executor.rejected,
+    }
+
+
+registry.collect("sherlock_cache_lookups_total", "Cache lookups by cache and result", _cache_series, kind="counter")
+registry.collect("sherlock_cache_hit_ratio", "Hit ratio per cache since startup", _cache_ratio_series)
+registry.collect("sherlock_queue_depth", "Work waiting or in flight per queue", _queue_series)
+registry.collect("sherlock_rejected_total", "Requests or jobs turned away under load", _shed_series, kind="counter")
+registry.collect(
+    "sherlock_idempotent_requests_total", "Requests carrying an Idempotency-Key by outcome",
+    lambda: {(("outcome", name),): value for name, value in idempotency_metrics.stats().items()},
+    kind="counter"
+)
+registry.collect(
+    "sherlock_osint_breakers_open", "OSINT sites currently skipped by their circuit breaker",
+    lambda: {(): site_stats.stats()["breakers_open"]}
+)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
+    # Only needed when launched directly; ASGI servers import main:app without it
+    from daphne.cli import CommandLineInterface
     CommandLineInterface().run(["main:app", "--bind", "127.0.0.1", "--port", "8000", "--application-close-timeout", "300"])
 
@@ -0,0 +1,117 @@
+"""gzip response compression negotiated by Accept-Encoding"""
+
+import asyncio
+import gzip
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from utils.etag import GZIP_SUFFIX
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding value allows a gzip response.
+
+    "gzip" with a non-zero q wins; otherwise "*" decides. Anything else,
+    including "gzip;q=0" and an "x-gzip"-only list, means no.
+    """
+    gzip_q = wildcard_q = None
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if coding not in ("gzip", "*"):
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value.strip())
+                except ValueError:
+                    q = 0.0
+        if coding == "gzip":
+            gzip_q = q
+        else:
+            wildcard_q = q
+    if gzip_q is not None:
+        return gzip_q > 0
+    return wildcard_q is not None and wildcard_q > 0
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that gzips response bodies when the client accepts it.
+
+    Bodies under minimum_size, responses that already have a Content-Encoding
+    and Server-Sent Events streams (which must not be buffered) pass through.
+    Bodies of thread_min_size or more are compressed in a worker thread so a
+    multi-megabyte conversation doesn't stall the event loop.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, level: int = 5, thread_min_size: int = 65536):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.thread_min_size = thread_min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not accepts_gzip(Headers(scope=scope).get("accept-encoding", "")):
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough, compressor
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or headers.get("content-type", "").startswith("text/event-stream"):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Hold the headers until the first body chunk decides the encoding
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                initial, start_message = start_message, None
+                if not more_body and len(body) < self.minimum_size:
+                    await send(initial)
+                    await send(message)
+                    return
+
+                headers = MutableHeaders(raw=initial["headers"])
+                headers["Content-Encoding"] = "gzip"
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and etag.endswith('"'):
+                    # The gzip body is a different representation, so it needs its own strong ETag
+                    headers["ETag"] = etag[:-1] + GZIP_SUFFIX + '"'
+                if not more_body:
+                    if len(body) >= self.thread_min_size:
+                        body = await asyncio.to_thread(gzip.compress, body, self.level)
+                    else:
+                        body = gzip.compress(body, self.level)
+                    headers["Content-Length"] = str(len(body))
+                    await send(initial)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                del headers["Content-Length"]
+                compressor = zlib.compressobj(self.level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+                await send(initial)
+
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.flush()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
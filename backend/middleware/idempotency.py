@@ -0,0 +1,339 @@
+"""Idempotency-Key support for POSTs that a retry must not repeat"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+from starlette.datastructures import Headers
+
+from config import settings
+from database import get_database
+from middleware.rate_limit import token_subject
+
+logger = logging.getLogger(__name__)
+
+# Each of these pushes a screenshot, pays for a vision call or both
+IDEMPOTENT_PATHS = {"/api/screenshot/upload", "/api/analyze/", "/api/analyze/upload"}
+
+MAX_KEY_LENGTH = 255
+# Seconds between checks on a key held by another worker
+POLL_INTERVAL = 0.5
+
+# (status, [(header, value)], body)
+StoredResponse = Tuple[int, List[Tuple[str, str]], bytes]
+
+
+def _storable(status: int) -> bool:
+    # A retry after a server error or a rate limit should run again
+    return status < 500 and status != 429
+
+
+def request_fingerprint(method: str, path: str, content_type: str, body: bytes) -> str:
+    """
+    Hash of what a request asks for; a key reused for a different request is rejected.
+
+    Multipart boundaries are random per attempt, so they are left out.
+    """
+    if content_type.startswith("multipart/") and "boundary=" in content_type:
+        boundary = content_type.split("boundary=", 1)[1].split(";", 1)[0].strip().strip('"')
+        if boundary:
+            body = body.replace(boundary.encode("latin-1"), b"")
+    digest = hashlib.sha256(f"{method} {path}\n".encode("utf-8"))
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Keys and their responses in the `idempotency_keys` collection, _id "<user>:<key>".
+
+    A request claims its key by inserting a "running" record whose lease lasts
+    IDEMPOTENCY_LOCK_TTL seconds, so a worker that dies mid-request can't wedge
+    the key. A finished response replaces it and is kept for IDEMPOTENCY_TTL.
+    """
+
+    def __init__(self):
+        self._index_ready = False
+
+    async def _collection(self):
+        db = await get_database()
+        if not self._index_ready:
+            await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+            self._index_ready = True
+        return db.idempotency_keys
+
+    async def claim(self, doc_id: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Claim the key; None if this request now owns it, otherwise the record holding it"""
+        collection = await self._collection()
+        now = datetime.utcnow()
+        record = {
+            "_id": doc_id,
+            "status": "running",
+            "fingerprint": fingerprint,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=settings.idempotency_lock_ttl)
+        }
+        try:
+            await collection.insert_one(record)
+            return None
+        except DuplicateKeyError:
+            pass
+
+        existing = await collection.find_one({"_id": doc_id})
+        if existing is None:
+            # Released or expired in between; the next attempt will claim it
+            return {"status": "released", "fingerprint": fingerprint}
+        if existing["status"] == "running" and existing["expires_at"] <= now:
+            # Lease ran out before the TTL monitor (once a minute) got to it: take over
+            result = await collection.replace_one(
+                {"_id": doc_id, "status": "running", "expires_at": existing["expires_at"]}, record
+            )
+            if result.matched_count:
+                return None
+        return existing
+
+    async def complete(self, doc_id: str, fingerprint: str, response: StoredResponse):
+        status, headers, body = response
+        collection = await self._collection()
+        now = datetime.utcnow()
+        await collection.replace_one(
+            {"_id": doc_id},
+            {
+                "status": "done",
+                "fingerprint": fingerprint,
+                "response": {"status": status, "headers": [list(pair) for pair in headers], "body": body},
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=settings.idempotency_ttl)
+            },
+            upsert=True
+        )
+
+    async def release(self, doc_id: str):
+        collection = await self._collection()
+        await collection.delete_one({"_id": doc_id, "status": "running"})
+
+
+class IdempotencyMetrics:
+    """Process-wide counters (the middleware instance is built by Starlette)"""
+
+    def __init__(self):
+        self.executed = 0
+        self.replayed = 0
+        self.attached = 0
+        self.mismatched = 0
+        self.conflicts = 0
+        self.backend_errors = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "attached": self.attached,
+            "mismatched": self.mismatched,
+            "conflicts": self.conflicts,
+            "backend_errors": self.backend_errors
+        }
+
+
+idempotency_metrics = IdempotencyMetrics()
+
+
+def _error(status: int, detail: str, retry_after: Optional[int] = None) -> StoredResponse:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    headers = [("content-type", "application/json"), ("content-length", str(len(body)))]
+    if retry_after is not None:
+        headers.append(("retry-after", str(retry_after)))
+    return status, headers, body
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware honouring Idempotency-Key on IDEMPOTENT_PATHS.
+
+    Keys are scoped to the authenticated user. The first request with a key
+    runs; repeats get its stored response with `Idempotent-Replayed: true`,
+    or wait for it while it is still running (up to IDEMPOTENCY_WAIT seconds,
+    then 409). Reusing a key for a different request body gives 422. Requests
+    without a key, or without a valid token, pass straight through.
+    """
+
+    def __init__(self, app, store: Optional[IdempotencyStore] = None):
+        self.app = app
+        self.store = store or IdempotencyStore()
+        # doc id -> (fingerprint, future) for requests running in this worker
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not settings.idempotency_enabled
+            or scope["method"] != "POST"
+            or scope["path"] not in IDEMPOTENT_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        key = headers.get("idempotency-key")
+        subject = token_subject(scope)
+        if key is None or subject is None:
+            await self.app(scope, receive, send)
+            return
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await self._send(send, _error(400, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters"))
+            return
+
+        body = await self._read_body(receive)
+        if body is None:
+            return  # client went away
+        fingerprint = request_fingerprint(scope["method"], scope["path"], headers.get("content-type", ""), body)
+        doc_id = f"{subject}:{key}"
+
+        try:
+            response = await self._existing_response(doc_id, fingerprint)
+        except Exception as e:
+            # Fail open: without the store the request simply isn't deduplicated
+            idempotency_metrics.backend_errors += 1
+            logger.error(f"Idempotency store failed: {e}")
+            await self.app(scope, self._replay_receive(body, receive), send)
+            return
+
+        if response is not None:
+            await self._send(send, response)
+            return
+        await self._run(scope, self._replay_receive(body, receive), send, doc_id, fingerprint)
+
+    async def _existing_response(self, doc_id: str, fingerprint: str) -> Optional[StoredResponse]:
+        """None once this request owns the key; otherwise the response to send instead of running"""
+        deadline = time.monotonic() + settings.idempotency_wait
+        attached = False
+        while True:
+            local = self._inflight.get(doc_id)
+            if local is not None:
+                # Running in this worker: wait on it directly
+                if local[0] != fingerprint:
+                    idempotency_metrics.mismatched += 1
+                    return _error(422, "Idempotency-Key was already used for a different request")
+                if not attached:
+                    idempotency_metrics.attached += 1
+                    attached = True
+                try:
+                    response = await asyncio.wait_for(
+                        asyncio.shield(local[1]), max(0.0, deadline - time.monotonic())
+                    )
+                except asyncio.TimeoutError:
+                    return self._conflict()
+                if response is not None:
+                    return self._replayed(response)
+                continue  # it failed without a response; try to run it ourselves
+
+            record = await self.store.claim(doc_id, fingerprint)
+            if record is None:
+                return None
+            if record["fingerprint"] != fingerprint:
+                idempotency_metrics.mismatched += 1
+                return _error(422, "Idempotency-Key was already used for a different request")
+            if record["status"] == "done":
+                stored = record["response"]
+                if not attached:
+                    idempotency_metrics.replayed += 1
+                return self._replayed(
+                    (stored["status"], [tuple(pair) for pair in stored["headers"]], bytes(stored["body"]))
+                )
+            if record["status"] == "running":
+                # Held by another worker: poll until it finishes or is released
+                if not attached:
+                    idempotency_metrics.attached += 1
+                    attached = True
+                if time.monotonic() >= deadline:
+                    return self._conflict()
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def _run(self, scope, receive, send, doc_id: str, fingerprint: str):
+        idempotency_metrics.executed += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[doc_id] = (fingerprint, future)
+        status = None
+        response_headers: List[Tuple[str, str]] = []
+        chunks: List[bytes] = []
+
+        async def send_capture(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers.extend(
+                    (name.decode("latin-1"), value.decode("latin-1")) for name, value in message.get("headers", [])
+                )
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        response = None
+        try:
+            await self.app(scope, receive, send_capture)
+            if status is not None:
+                response = (status, response_headers, b"".join(chunks))
+        finally:
+            del self._inflight[doc_id]
+            storable = response is not None and _storable(response[0])
+            # Like waiters in other workers, which find the key released, waiters here
+            # get None for an unstored response and run the request again
+            future.set_result(response if storable else None)
+            try:
+                if storable:
+                    await self.store.complete(doc_id, fingerprint, response)
+                else:
+                    await self.store.release(doc_id)
+            except Exception as e:
+                idempotency_metrics.backend_errors += 1
+                logger.error(f"Idempotency store write failed: {e}")
+
+    @staticmethod
+    def _replayed(response: StoredResponse) -> StoredResponse:
+        status, headers, body = response
+        return status, headers + [("idempotent-replayed", "true")], body
+
+    @staticmethod
+    def _conflict() -> StoredResponse:
+        idempotency_metrics.conflicts += 1
+        return _error(409, "A request with this Idempotency-Key is still in progress", retry_after=5)
+
+    @staticmethod
+    async def _read_body(receive) -> Optional[bytes]:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    @staticmethod
+    def _replay_receive(body: bytes, receive):
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return replay
+
+    @staticmethod
+    async def _send(send, response: StoredResponse):
+        status, headers, body = response
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+        await send({"type": "http.response.body", "body": body})
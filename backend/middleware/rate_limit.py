@@ -0,0 +1,243 @@
+"""Token-bucket rate limiting middleware with per-route cost weights"""
+
+import json
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from jose import JWTError, jwt
+from pymongo import ReturnDocument
+
+from config import settings
+from database import get_database
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+# (method, path prefix, cost) - first match wins; everything else costs DEFAULT_COST.
+# Costs are in bucket tokens; a bucket holds rate_limit_requests tokens.
+ROUTE_COSTS: List[Tuple[str, str, int]] = [
+    ("POST", "/api/analyze", 10),
+    ("POST", "/api/osint", 20),
+    ("GET", "/api/osint/check", 20),
+    ("POST", "/api/wingman/suggest-reply", 5),
+    ("POST", "/api/screenshot/upload", 2),
+    ("POST", "/api/auth/login", 3),
+    ("POST", "/api/auth/register", 3),
+]
+DEFAULT_COST = 1
+
+EXEMPT_PATHS = {"/", "/health", "/metrics", "/docs", "/redoc", "/openapi.json"}
+
+
+def route_cost(method: str, path: str) -> Tuple[int, str]:
+    """Token cost of a request and the route label used for metrics"""
+    for route_method, prefix, cost in ROUTE_COSTS:
+        if method == route_method and path.startswith(prefix):
+            return cost, f"{route_method} {prefix}"
+    return DEFAULT_COST, "other"
+
+
+def token_payload(scope) -> Optional[Dict[str, Any]]:
+    """
+    Verified claims of the request's bearer token, or None without a valid one.
+    
+    Decoded by the first layer that asks and kept in scope["state"], so the
+    middlewares and the auth dependency share one signature check per request.
+    """
+    state = scope.setdefault("state", {})
+    if "token_payload" in state:
+        return state["token_payload"]
+    payload = None
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            auth = value.decode("latin-1")
+            if auth.lower().startswith("bearer "):
+                try:
+                    with span("auth.jwt"):
+                        payload = jwt.decode(auth[7:], settings.secret_key, algorithms=[settings.algorithm])
+                except JWTError:
+                    pass
+            break
+    state["token_payload"] = payload
+    return payload
+
+
+def token_subject(scope) -> Optional[str]:
+    """JWT "sub" of the request's bearer token, or None without a valid one"""
+    payload = token_payload(scope)
+    return (payload.get("sub") or None) if payload else None
+
+
+class InMemoryRateLimitBackend:
+    """Per-process token buckets; fine for a single worker"""
+
+    def __init__(self, max_keys: int = 50000):
+        self.max_keys = max_keys
+        # key -> (tokens, last refill monotonic time)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def take(self, key: str, cost: int, capacity: float, rate: float) -> Tuple[bool, float]:
+        """Try to take `cost` tokens; returns (allowed, seconds until enough tokens)"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+
+        if tokens >= cost:
+            self._buckets[key] = (tokens - cost, now)
+            allowed, wait = True, 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            allowed, wait = False, (cost - tokens) / rate
+
+        if len(self._buckets) > self.max_keys:
+            self._prune(now, capacity, rate)
+        return allowed, wait
+
+    def _prune(self, now: float, capacity: float, rate: float):
+        # Buckets that have refilled completely carry no state worth keeping
+        full_after = capacity / rate
+        self._buckets = {
+            key: value for key, value in self._buckets.items()
+            if now - value[1] < full_after
+        }
+
+
+class MongoRateLimitBackend:
+    """
+    Buckets shared by all workers in the `rate_limits` collection.
+
+    Refill and take happen in one pipeline update, so concurrent workers can't
+    double-spend tokens.
+    """
+
+    def __init__(self):
+        self._index_ready = False
+
+    async def _collection(self):
+        db = await get_database()
+        if not self._index_ready:
+            await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+            self._index_ready = True
+        return db.rate_limits
+
+    async def take(self, key: str, cost: int, capacity: float, rate: float) -> Tuple[bool, float]:
+        collection = await self._collection()
+        now = datetime.utcnow()
+        elapsed_seconds = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        refilled = {"$min": [capacity, {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed_seconds, rate]}]}]}
+
+        doc = await collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"_refilled": refilled}},
+                {"$set": {
+                    "allowed": {"$gte": ["$_refilled", cost]},
+                    "tokens": {"$cond": [
+                        {"$gte": ["$_refilled", cost]},
+                        {"$subtract": ["$_refilled", cost]},
+                        "$_refilled"
+                    ]},
+                    "updated_at": now,
+                    "expires_at": now + timedelta(seconds=capacity / rate * 2)
+                }},
+                {"$unset": "_refilled"}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+        if doc["allowed"]:
+            return True, 0.0
+        return False, (cost - doc["tokens"]) / rate
+
+
+class RateLimitMetrics:
+    """Process-wide limiter counters (the middleware instance is built by Starlette)"""
+
+    def __init__(self):
+        self.allowed = 0
+        self.limited = 0
+        self.backend_errors = 0
+        self.limited_by_route: Dict[str, int] = {}
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "backend_errors": self.backend_errors,
+            "limited_by_route": dict(self.limited_by_route)
+        }
+
+
+rate_limit_metrics = RateLimitMetrics()
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware enforcing RATE_LIMIT_REQUESTS tokens per RATE_LIMIT_PERIOD seconds.
+
+    Buckets are keyed by the authenticated user (JWT "sub") or the client IP.
+    Rejected requests get 429 with Retry-After.
+    """
+
+    def __init__(self, app, backend: Optional[object] = None):
+        self.app = app
+        if backend is None:
+            backend = MongoRateLimitBackend() if settings.rate_limit_backend == "mongo" else InMemoryRateLimitBackend()
+        self.backend = backend
+        self.capacity = float(settings.rate_limit_requests)
+        self.rate = settings.rate_limit_requests / settings.rate_limit_period
+
+    @staticmethod
+    def _client_key(scope) -> str:
+        subject = token_subject(scope)
+        if subject:
+            return f"user:{subject}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not settings.rate_limit_enabled
+            or scope["method"] == "OPTIONS"
+            or scope["path"] in EXEMPT_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        cost, route = route_cost(scope["method"], scope["path"])
+        # A bucket never holds more than its capacity, so a dearer route would be refused forever;
+        # with a small RATE_LIMIT_REQUESTS such a request costs a full bucket instead
+        cost = min(cost, self.capacity)
+        try:
+            allowed, wait = await self.backend.take(self._client_key(scope), cost, self.capacity, self.rate)
+        except Exception as e:
+            # Fail open: a limiter outage must not take the API down with it
+            rate_limit_metrics.backend_errors += 1
+            logger.error(f"Rate limiter backend failed: {e}")
+            allowed, wait = True, 0.0
+
+        if allowed:
+            rate_limit_metrics.allowed += 1
+            await self.app(scope, receive, send)
+            return
+
+        rate_limit_metrics.limited += 1
+        by_route = rate_limit_metrics.limited_by_route
+        by_route[route] = by_route.get(route, 0) + 1
+
+        body = json.dumps({"detail": "Rate limit exceeded"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,61 @@
+"""Per-request span collection, Server-Timing header and route latency histograms"""
+
+import time
+from typing import Dict
+
+from utils.metrics import request_duration, server_timing, start_request_spans
+
+
+def _route_template(scope) -> str:
+    """Matched route path (e.g. /api/analyze/{analysis_id}) so metric labels stay bounded"""
+    app = scope.get("app")
+    endpoint = scope.get("endpoint")
+    if app is None or endpoint is None:
+        return "unmatched"
+    templates: Dict = getattr(app.state, "route_templates", None)
+    if templates is None:
+        templates = {getattr(route, "endpoint", None): route.path for route in app.routes}
+        app.state.route_templates = templates
+    return templates.get(endpoint, "unmatched")
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware that collects spans recorded while handling a request.
+
+    Adds a Server-Timing header (stages finished before the response started,
+    plus the total) and observes the full request duration, body included,
+    per route template, method and status.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans = start_request_spans()
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing(spans, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", header.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_duration.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=_route_template(scope),
+                status=str(status)
+            )
@@ -0,0 +1,223 @@
+"""Admission control and fair scheduling for upstream model calls"""
+
+import asyncio
+import math
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from config import settings
+from utils.metrics import record_span
+from utils.priority import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, PRIORITY_NAMES
+
+# Seconds per model call assumed until real calls have been timed
+INITIAL_CALL_SECONDS = 10.0
+
+
+class AIOverloaded(Exception):
+    """Raised when a model call is shed; carries a suggested retry delay in seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"AI service busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AICaller:
+    """Who model calls are made for: the user they queue under and their priority"""
+
+    __slots__ = ("user_id", "priority")
+
+    def __init__(self, user_id: Optional[str], priority: int = PRIORITY_INTERACTIVE):
+        self.user_id = user_id or "anonymous"
+        self.priority = priority
+
+
+# Caller of the model calls made in the current task; tasks inherit it when created
+ai_caller: ContextVar[Optional[AICaller]] = ContextVar("ai_caller", default=None)
+
+
+def use_ai_caller(user_id: Optional[str], priority: int = PRIORITY_INTERACTIVE) -> AICaller:
+    """Attribute the current task's model calls (and those of tasks it starts) to a user"""
+    caller = AICaller(user_id, priority)
+    ai_caller.set(caller)
+    return caller
+
+
+class _Waiter:
+    __slots__ = ("caller", "priority", "future", "enqueued_at")
+
+    def __init__(self, caller: AICaller, future: asyncio.Future, enqueued_at: float):
+        self.caller = caller
+        self.priority = caller.priority  # the queue it sits in
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class AIAdmission:
+    """
+    At most `limit` model calls in flight; the rest wait in priority queues.
+
+    Within a priority, users take turns (round robin), so one user's burst
+    doesn't hold everyone else's calls back. A call whose estimated wait
+    exceeds its priority's queue-time SLO, or whose user already has
+    `max_queued_per_user` calls waiting, is shed at once with AIOverloaded
+    rather than queued; a waiting call that outlives its SLO is shed too.
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = None,
+        max_queued_per_user: Optional[int] = None,
+        slos: Optional[Dict[int, float]] = None
+    ):
+        self.limit = limit or settings.ai_max_concurrency
+        self.max_queued_per_user = max_queued_per_user or settings.ai_max_queued_per_user
+        self.slos = slos or {
+            PRIORITY_INTERACTIVE: settings.ai_queue_slo_interactive,
+            PRIORITY_BACKGROUND: settings.ai_queue_slo_background
+        }
+        # priority -> user -> waiting calls; users in round-robin order
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {}
+        self.running = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+        self._avg_duration = INITIAL_CALL_SECONDS  # seconds, moving average
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the `limit` slots for a model call, queueing for it if needed"""
+        caller = ai_caller.get() or AICaller(None)
+        waited = await self._acquire(caller)
+        if waited:
+            record_span("model.queue_wait", waited)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            yield
+        finally:
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * (loop.time() - started)
+            self._release()
+
+    def reprioritize(self, caller: AICaller, priority: int):
+        """Change a caller's priority, moving its waiting calls, e.g. once nobody waits for them"""
+        caller.priority = priority
+        moved = [
+            waiter for users in self._queues.values() for waiters in users.values()
+            for waiter in waiters if waiter.caller is caller and waiter.priority != priority
+        ]
+        for waiter in moved:
+            self._remove(waiter)
+            self._enqueue(waiter)
+
+    def estimated_wait(self, caller: AICaller) -> float:
+        """Seconds until a call queued now for `caller` would start"""
+        if self.running < self.limit and not self.queued:
+            return 0.0
+        ahead = 0
+        for priority, users in self._queues.items():
+            if priority < caller.priority:
+                ahead += sum(len(waiters) for waiters in users.values())
+            elif priority == caller.priority:
+                # Round robin: every other user gets up to as many turns first as this call is deep
+                turn = len(users.get(caller.user_id, ())) + 1
+                ahead += turn - 1 + sum(
+                    min(len(waiters), turn) for user_id, waiters in users.items() if user_id != caller.user_id
+                )
+        return (ahead + 1) / self.limit * self._avg_duration
+
+    async def _acquire(self, caller: AICaller) -> float:
+        """Take a slot; returns the seconds spent queued"""
+        if self.running < self.limit and not self.queued:
+            self.running += 1
+            self.admitted += 1
+            return 0.0
+
+        wait = self.estimated_wait(caller)
+        users = self._queues.get(caller.priority, {})
+        if len(users.get(caller.user_id, ())) >= self.max_queued_per_user or wait > self._slo(caller.priority):
+            self.shed += 1
+            raise AIOverloaded(max(1, math.ceil(wait)))
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(caller, loop.create_future(), loop.time())
+        self._enqueue(waiter)
+        try:
+            while not waiter.future.done():
+                remaining = waiter.enqueued_at + self._slo(caller.priority) - loop.time()
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), max(0.0, remaining))
+                except asyncio.TimeoutError:
+                    # The SLO may have grown meanwhile if the caller was moved to background
+                    if not waiter.future.done() and loop.time() - waiter.enqueued_at >= self._slo(caller.priority):
+                        self._remove(waiter)
+                        self.timed_out += 1
+                        raise AIOverloaded(max(1, math.ceil(self.estimated_wait(caller))))
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                self._release()  # granted just as the caller gave up
+            else:
+                self._remove(waiter)
+            raise
+        self.admitted += 1
+        return loop.time() - waiter.enqueued_at
+
+    def _release(self):
+        """Hand the slot straight to the next waiter, or free it"""
+        waiter = self._next_waiter()
+        if waiter is None:
+            self.running -= 1
+        else:
+            waiter.future.set_result(None)
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            if not users:
+                continue
+            user_id, waiters = next(iter(users.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                users.move_to_end(user_id)
+            else:
+                del users[user_id]
+            self.queued -= 1
+            return waiter
+        return None
+
+    def _enqueue(self, waiter: _Waiter):
+        waiter.priority = waiter.caller.priority
+        users = self._queues.setdefault(waiter.priority, OrderedDict())
+        users.setdefault(waiter.caller.user_id, deque()).append(waiter)
+        self.queued += 1
+
+    def _remove(self, waiter: _Waiter):
+        users = self._queues[waiter.priority]
+        waiters = users[waiter.caller.user_id]
+        waiters.remove(waiter)
+        if not waiters:
+            del users[waiter.caller.user_id]
+        self.queued -= 1
+
+    def _slo(self, priority: int) -> float:
+        return self.slos.get(priority, self.slos[PRIORITY_BACKGROUND])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "queued": self.queued,
+            "queued_by_priority": {
+                PRIORITY_NAMES.get(priority, str(priority)): sum(len(waiters) for waiters in users.values())
+                for priority, users in sorted(self._queues.items())
+            },
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "avg_call_seconds": round(self._avg_duration, 3)
+        }
+
+
+ai_admission = AIAdmission()
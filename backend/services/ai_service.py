@@ -1,27 +1,70 @@
 """AI Service for OpenAI GPT-4o Vision and Claude integration"""
 
+import asyncio
 import json
 import base64
 import re
 import logging
 from typing import Dict, Any, Optional
-from openai import OpenAI
+from openai import AsyncOpenAI
 from config import settings
+from services.ai_admission import ai_admission, AIOverloaded
+from utils.helpers import strip_code_fence
+from utils.metrics import span, upstream_tokens
 from utils.prompts import get_contextual_prompt
 
 logger = logging.getLogger(__name__)
 
 
+def parse_analysis_content(content: str) -> Dict[str, Any]:
+    """Parse the analysis JSON out of model text, keeping the cleaned text as raw_ai_response"""
+    content = strip_code_fence(content)
+    
+    try:
+        analysis = json.loads(content)
+    except json.JSONDecodeError:
+        # If JSON parsing fails, try to extract JSON from text
+        json_match = re.search(r'\{.*\}', content, re.DOTALL)
+        if json_match:
+            analysis = json.loads(json_match.group())
+        else:
+            logger.error(f"Failed to parse JSON. Content: {content}")
+            raise ValueError("Could not parse JSON from AI response")
+    
+    # Store raw response for debugging
+    analysis["raw_ai_response"] = content
+    return analysis
+
+
 class AIService:
     """Handle AI API calls"""
     
     def __init__(self):
-        self.openai_client = OpenAI(
+        # Async client so model calls don't block the event loop
+        self.openai_client = AsyncOpenAI(
             api_key=settings.openai_api_key,
             base_url=settings.openai_base_url
         )
         self.model = settings.openai_model
     
+    async def _complete(self, call: str, timeout: Optional[float] = None, **kwargs):
+        """
+        Chat completion timed as the model.<call> stage, with billed tokens counted.
+        
+        Goes through admission control first; raises AIOverloaded when shed.
+        `timeout` bounds the queue wait and the call together (asyncio.TimeoutError).
+        """
+        if timeout is not None:
+            return await asyncio.wait_for(self._complete(call, **kwargs), timeout)
+        async with ai_admission.slot():
+            with span(f"model.{call}"):
+                response = await self.openai_client.chat.completions.create(**kwargs)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            upstream_tokens.inc(usage.prompt_tokens or 0, call=call, kind="prompt", model=self.model)
+            upstream_tokens.inc(usage.completion_tokens or 0, call=call, kind="completion", model=self.model)
+        return response
+    
     async def analyze_screenshot(
         self,
         image_bytes: bytes,
@@ -29,7 +72,23 @@ class AIService:
         conversation_stage: Optional[str] = None,
         osint_context: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        """Analyze screenshot using GPT-4o Vision"""
+        """Analyze screenshot using GPT-4o Vision, parsed into a dict"""
+        content = await self.analyze_screenshot_text(image_bytes, user_preferences, conversation_stage, osint_context)
+        try:
+            return parse_analysis_content(content)
+        except Exception as e:
+            logger.error(f"AI analysis failed: {str(e)}")
+            raise Exception(f"AI analysis failed: {str(e)}")
+    
+    async def analyze_screenshot_text(
+        self,
+        image_bytes: bytes,
+        user_preferences: Optional[Dict[str, Any]] = None,
+        conversation_stage: Optional[str] = None,
+        osint_context: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> str:
+        """Analyze screenshot using GPT-4o Vision; returns the model's unparsed text"""
         
         # Encode image to base64
         image_base64 = base64.b64encode(image_bytes).decode('utf-8')
@@ -61,7 +120,9 @@ class AIService:
         logger.info(f"Sending request to OpenAI model: {self.model}")
         
         try:
-            response = self.openai_client.chat.completions.create(
+            response = await self._complete(
+                "analyze",
+                timeout=timeout,
                 model=self.model,
                 messages=[
                     {
@@ -93,39 +154,15 @@ class AIService:
             logger.info("Received response from OpenAI")
             logger.debug(f"Raw content: {content[:100]}...")
             
-            # Try to parse JSON from response
-            # Sometimes GPT returns markdown code blocks
-            content = content.strip()
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-            
-            # Parse JSON
-            try:
-                analysis = json.loads(content)
-            except json.JSONDecodeError:
-                # If JSON parsing fails, try to extract JSON from text
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    analysis = json.loads(json_match.group())
-                else:
-                    logger.error(f"Failed to parse JSON. Content: {content}")
-                    raise ValueError("Could not parse JSON from AI response")
-            
-            # Store raw response for debugging
-            analysis["raw_ai_response"] = content
-            
-            return analysis
+            return content
             
+        except (AIOverloaded, asyncio.TimeoutError):
+            raise
         except Exception as e:
             logger.error(f"AI analysis failed: {str(e)}")
             raise Exception(f"AI analysis failed: {str(e)}")
 
-    async def extract_metadata(self, image_bytes: bytes) -> Dict[str, Any]:
+    async def extract_metadata(self, image_bytes: bytes, timeout: Optional[float] = None) -> Dict[str, Any]:
         """Extract comprehensive profile information from image for OSINT"""
         image_base64 = base64.b64encode(image_bytes).decode('utf-8')
         
@@ -158,7 +195,9 @@ class AIService:
         }"""
 
         try:
-            response = self.openai_client.chat.completions.create(
+            response = await self._complete(
+                "metadata",
+                timeout=timeout,
                 model=self.model,
                 messages=[
                     {"role": "user", "content": [
@@ -219,7 +258,8 @@ Provide 3 reply suggestions in JSON format:
 }}"""
         
         try:
-            response = self.openai_client.chat.completions.create(
+            response = await self._complete(
+                "reply",
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are a dating coach helping craft perfect text replies."},
@@ -240,6 +280,8 @@ Provide 3 reply suggestions in JSON format:
             result = json.loads(content.strip())
             return result.get("suggestions", [])
             
+        except AIOverloaded:
+            raise
         except Exception as e:
             raise Exception(f"Reply generation failed: {str(e)}")
 
@@ -1,10 +1,20 @@
 """Core analysis engine that processes AI responses and structures data"""
 
-from typing import Dict, Any, Optional
+import re
+from typing import Dict, Any, Optional, Union
+import orjson
 from database.schemas import (
-    Analysis, VibeReport, Flag, PowerDynamics, SuggestedReply
+    Analysis, VibeReport, Flag, PowerDynamics, SuggestedReply, ModelAnalysis
 )
 from datetime import datetime
+from utils.helpers import strip_code_fence
+
+
+# Keys of the model's JSON that reach the Analysis; everything else on it is ours
+MODEL_OUTPUT_FIELDS = (
+    "interest_score", "vibe_report", "red_flags", "green_flags", "power_dynamics",
+    "suggested_replies", "wingman_notes", "platform", "participant_name"
+)
 
 
 class AnalysisEngine:
@@ -82,6 +92,47 @@ class AnalysisEngine:
         
         return analysis
     
+    @staticmethod
+    def parse_model_output(
+        content: Union[str, bytes],
+        conversation_id: str,
+        user_id: str
+    ) -> ModelAnalysis:
+        """Validate the model's analysis text into an Analysis in one pass.
+        
+        Same result as parse_analysis_content + process_ai_response: one orjson
+        parse, then a single model_validate builds every nested model with the
+        lenient defaults on ModelAnalysis. platform and participant_name are
+        kept on the model but excluded from model_dump.
+        """
+        if isinstance(content, bytes):
+            content = content.decode("utf-8")
+        content = strip_code_fence(content)
+        try:
+            data = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Prose around the JSON: retry on the outermost {...}
+            json_match = re.search(r'\{.*\}', content, re.DOTALL)
+            if not json_match:
+                raise ValueError("Could not parse JSON from AI response")
+            data = orjson.loads(json_match.group())
+        if not isinstance(data, dict):
+            raise ValueError("AI response is not a JSON object")
+        
+        # The model can't set server-owned fields such as enrichment_status
+        data = {key: data[key] for key in MODEL_OUTPUT_FIELDS if key in data}
+        # Fill in our fields on the dict so validation is the only pass
+        now = datetime.utcnow()
+        data["conversation_id"] = conversation_id
+        data["user_id"] = user_id
+        data["timestamp"] = now
+        data["raw_ai_response"] = content
+        for key in ("red_flags", "green_flags"):
+            for flag in data.get(key) or ():
+                if isinstance(flag, dict):
+                    flag["detected_at"] = now
+        return ModelAnalysis.model_validate(data)
+    
     @staticmethod
     def calculate_conversation_health(analysis: Analysis) -> float:
         """Calculate overall conversation health score (0-10)"""
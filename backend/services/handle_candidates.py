@@ -0,0 +1,83 @@
+"""Generate likely usernames from display names and extracted profile metadata"""
+
+import re
+import unicodedata
+from typing import Dict, Any, List, Optional
+
+from config import settings
+
+_PLACEHOLDERS = {"", "unknown", "null", "none", "n/a"}
+_INVALID_CHARS = re.compile(r"[^a-z0-9._]")
+
+
+def _ascii_words(text: Optional[str]) -> List[str]:
+    """Lowercase ASCII words of a free-text field, or [] for placeholders"""
+    if not text or not isinstance(text, str) or text.strip().lower() in _PLACEHOLDERS:
+        return []
+    folded = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    return [word for word in re.split(r"[^a-z0-9]+", folded) if word]
+
+
+def clean_handle(handle: Optional[str]) -> Optional[str]:
+    """Strip @, whitespace and URL prefixes from a handle; None if nothing usable remains"""
+    if not handle or not isinstance(handle, str) or handle.strip().lower() in _PLACEHOLDERS:
+        return None
+    handle = handle.strip().rstrip("/").split("/")[-1].lstrip("@")
+    if " " in handle:
+        return None
+    return handle or None
+
+
+def generate_candidates(
+    display_name: Optional[str] = None,
+    username: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None
+) -> List[str]:
+    """
+    Likely handles, most probable first.
+
+    An explicit username always leads. Display names like "John Doe" expand to
+    johndoe, john.doe, john_doe, jdoe, johnd and doejohn; location and
+    occupation add a few suffixed variants such as johndoe_nyc.
+    """
+    limit = limit or settings.osint_max_candidates
+    metadata = metadata or {}
+    candidates: List[str] = []
+
+    def add(handle: Optional[str]):
+        if not handle:
+            return
+        handle = _INVALID_CHARS.sub("", handle.lower()).strip("._")
+        if len(handle) >= 3 and handle not in candidates:
+            candidates.append(handle)
+
+    add(clean_handle(username or metadata.get("username")))
+
+    display_name = display_name or metadata.get("participant_name")
+    # A display name without spaces ("@jdoe_99") is most likely the handle itself
+    add(clean_handle(display_name))
+
+    # Only names with spaces are expanded into first/last-name variants
+    words = _ascii_words(display_name) if display_name and " " in display_name.strip() else []
+    if len(words) >= 2:
+        first, last = words[0], words[-1]
+        base = [
+            first + last,
+            f"{first}.{last}",
+            f"{first}_{last}",
+            first[0] + last,
+            first + last[0],
+            last + first,
+        ]
+        for handle in base:
+            add(handle)
+
+        for extra in (metadata.get("location"), metadata.get("occupation")):
+            extra_words = _ascii_words(extra)
+            if extra_words:
+                tag = extra_words[0] if len(extra_words) == 1 else "".join(word[0] for word in extra_words)
+                add(f"{first}{last}_{tag}")
+                add(f"{first}{tag}")
+
+    return candidates[:limit]
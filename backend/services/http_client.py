@@ -0,0 +1,56 @@
+"""Process-wide pooled HTTP client for outbound OSINT traffic"""
+
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_client: Optional[httpx.AsyncClient] = None
+_fetch_limit: Optional[asyncio.Semaphore] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive client (HTTP/2 when h2 is installed); created on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            headers={"User-Agent": USER_AGENT},
+            timeout=httpx.Timeout(settings.osint_probe_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive,
+                keepalive_expiry=30.0
+            ),
+            verify=False
+        )
+    return _client
+
+
+def get_fetch_limit() -> asyncio.Semaphore:
+    """Global cap on concurrent OSINT page fetches across all scans"""
+    global _fetch_limit
+    if _fetch_limit is None:
+        _fetch_limit = asyncio.Semaphore(settings.osint_fetch_concurrency)
+    return _fetch_limit
+
+
+async def close_http_client():
+    """Close the shared client on shutdown"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
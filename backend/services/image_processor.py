@@ -1,6 +1,5 @@
 """Image processing service"""
 
-from PIL import Image
 import io
 from typing import Optional, Tuple
 from utils.helpers import decode_base64_image, validate_image_format, get_image_dimensions
@@ -15,7 +14,15 @@ class ImageProcessor:
         try:
             # Decode base64
             image_bytes = decode_base64_image(base64_image)
-            
+        except Exception as e:
+            raise ValueError(f"Image processing failed: {str(e)}")
+        return await ImageProcessor.process_image_bytes(image_bytes)
+    
+    @staticmethod
+    async def process_image_bytes(image_bytes: bytes) -> dict:
+        """Process raw screenshot bytes, e.g. straight from a multipart upload"""
+        from PIL import Image  # deferred so importing the app doesn't load Pillow
+        try:
             # Validate format
             if not validate_image_format(image_bytes):
                 raise ValueError("Invalid image format")
@@ -40,6 +47,7 @@ class ImageProcessor:
     @staticmethod
     async def resize_image_if_needed(image_bytes: bytes, max_size: Tuple[int, int] = (2048, 2048)) -> bytes:
         """Resize image if it exceeds max dimensions"""
+        from PIL import Image
         try:
             img = Image.open(io.BytesIO(image_bytes))
             
@@ -0,0 +1,111 @@
+"""Mongo-backed cache of OSINT scan results"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlparse
+
+from config import settings
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_username(username: str) -> str:
+    """Cache key for a handle: trimmed, without a leading @, lowercased"""
+    return username.strip().lstrip("@").lower()
+
+
+class OsintCache:
+    """
+    Scan results in the `osint_cache` collection, keyed by normalized username.
+
+    Results with found accounts live for OSINT_CACHE_POSITIVE_TTL seconds, empty
+    results for OSINT_CACHE_NEGATIVE_TTL. Sites listed in OSINT_CACHE_SITE_TTLS
+    shorten the lifetime of any result that includes them. After expiry an entry
+    may still be served as "stale" for OSINT_CACHE_STALE_TTL seconds while a
+    fresh scan runs in the background.
+    """
+
+    def __init__(self):
+        self._index_ready = False
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    async def _collection(self):
+        db = await get_database()
+        if not self._index_ready:
+            await db.osint_cache.create_index("stale_at", expireAfterSeconds=0)
+            self._index_ready = True
+        return db.osint_cache
+
+    @staticmethod
+    def _ttl_for(result: Dict[str, Any]) -> int:
+        accounts = result.get("found_accounts") or []
+        ttl = settings.osint_cache_positive_ttl if accounts else settings.osint_cache_negative_ttl
+        for account in accounts:
+            host = urlparse(account.get("url", "")).netloc or account.get("site", "")
+            site_ttl = settings.osint_cache_site_ttls.get(host)
+            if site_ttl is not None:
+                ttl = min(ttl, site_ttl)
+        return ttl
+
+    async def get(self, username: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Return (result, "fresh" | "stale") or (None, None) on a miss"""
+        try:
+            collection = await self._collection()
+            doc = await collection.find_one({"_id": normalize_username(username)})
+        except Exception as e:
+            logger.error(f"OSINT cache read failed: {e}")
+            doc = None
+
+        now = datetime.utcnow()
+        if doc is None or doc["stale_at"] <= now:
+            self.misses += 1
+            return None, None
+        if doc["expires_at"] > now:
+            self.hits += 1
+            return doc["result"], "fresh"
+        self.stale_hits += 1
+        return doc["result"], "stale"
+
+    async def set(self, username: str, result: Dict[str, Any]):
+        """Store a completed scan; error results are never cached"""
+        if "error" in result:
+            return
+
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self._ttl_for(result))
+        stale_at = expires_at + timedelta(seconds=settings.osint_cache_stale_ttl)
+        try:
+            collection = await self._collection()
+            await collection.replace_one(
+                {"_id": normalize_username(username)},
+                {
+                    "result": result,
+                    "found": bool(result.get("found_accounts")),
+                    "scanned_at": now,
+                    "expires_at": expires_at,
+                    "stale_at": stale_at
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"OSINT cache write failed: {e}")
+
+    async def invalidate(self, username: str):
+        collection = await self._collection()
+        await collection.delete_one({"_id": normalize_username(username)})
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+        }
+
+
+osint_cache = OsintCache()
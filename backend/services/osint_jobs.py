@@ -0,0 +1,258 @@
+"""Queued OSINT scan jobs run by a fixed pool of workers"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import settings
+from utils.cache import TTLCache
+from utils.metrics import record_span
+from utils.priority import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, PRIORITY_NAMES
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when a job is shed; carries a suggested retry delay in seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"OSINT queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class OsintJob:
+    """One queued scan: its run coroutine, state and final result"""
+
+    __slots__ = (
+        "id", "label", "priority", "status", "owners", "result",
+        "created_at", "started_at", "finished_at", "_run", "_on_shed", "_done"
+    )
+
+    def __init__(
+        self,
+        label: str,
+        run: Optional[Callable[[], Awaitable[Dict[str, Any]]]],
+        priority: int,
+        on_shed: Optional[Callable[[], None]] = None
+    ):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.priority = priority
+        self.status = "queued"  # queued, running, done, failed, shed
+        self.owners: set = set()
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._run = run
+        self._on_shed = on_shed
+        self._done = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "shed")
+
+    def _finish(self, status: str, result: Optional[Dict[str, Any]]):
+        self.status = status
+        self.result = result
+        self.finished_at = datetime.utcnow()
+        self._run = None
+        self._done.set()
+
+    async def wait(self) -> Optional[Dict[str, Any]]:
+        """Block until the job finishes and return its result"""
+        await self._done.wait()
+        return self.result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "username": self.label,
+            "status": self.status,
+            "priority": PRIORITY_NAMES.get(self.priority, str(self.priority)),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class OsintJobQueue:
+    """
+    Priority queue of OSINT scans drained by `workers` worker tasks.
+
+    Interactive jobs run before background ones. Background jobs are shed once
+    `max_background` jobs are waiting; when the whole queue is full, an
+    interactive job evicts the newest waiting background job or is shed itself.
+    Finished jobs are kept for `retention` seconds so their status can be polled.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        max_background: Optional[int] = None,
+        retention: Optional[float] = None
+    ):
+        self.workers = workers or settings.osint_workers
+        self.max_queued = max_queued or settings.osint_queue_max
+        self.max_background = max_background or settings.osint_queue_background_max
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._available: Optional[asyncio.Semaphore] = None  # one permit per heap entry
+        self._worker_tasks: List[asyncio.Task] = []
+        self._jobs: Dict[str, OsintJob] = {}  # queued and running
+        self._finished = TTLCache(maxsize=10000, ttl=retention or settings.osint_job_retention)
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.shed = 0
+        self._avg_duration = settings.osint_scan_timeout / 2  # seconds, moving average
+
+    def start(self):
+        """Start the worker tasks; called on startup and lazily on first submit"""
+        if self._worker_tasks:
+            return
+        self._available = asyncio.Semaphore(len(self._heap))
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"osint-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        """Cancel the workers; running scans are abandoned"""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def retry_after(self) -> int:
+        """Rough seconds until the current backlog drains"""
+        return max(1, math.ceil((self.queued + self.running) / self.workers * self._avg_duration))
+
+    def submit(
+        self,
+        label: str,
+        run: Callable[[], Awaitable[Dict[str, Any]]],
+        priority: int = PRIORITY_INTERACTIVE,
+        on_shed: Optional[Callable[[], None]] = None
+    ) -> OsintJob:
+        """Queue a job, raising QueueFull if it has to be shed"""
+        self.start()
+        if priority >= PRIORITY_BACKGROUND and self._queued_background() >= self.max_background:
+            self.shed += 1
+            raise QueueFull(self.retry_after())
+        if self.queued >= self.max_queued and not self._evict_background():
+            self.shed += 1
+            raise QueueFull(self.retry_after())
+
+        job = OsintJob(label, run, priority, on_shed)
+        self._jobs[job.id] = job
+        self._push(job)
+        return job
+
+    def completed_job(self, label: str, result: Dict[str, Any]) -> OsintJob:
+        """Record a job answered without a scan (e.g. from cache)"""
+        job = OsintJob(label, None, PRIORITY_INTERACTIVE)
+        job._finish("done", result)
+        self._finished.set(job.id, job)
+        return job
+
+    def promote(self, job: OsintJob, priority: int):
+        """Raise a waiting job's priority, e.g. when an interactive request joins a background scan"""
+        if job.status == "queued" and priority < job.priority:
+            job.priority = priority
+            # The old heap entry is skipped when popped
+            self.queued -= 1
+            self._push(job)
+
+    def get(self, job_id: str) -> Optional[OsintJob]:
+        return self._jobs.get(job_id) or self._finished.get(job_id)
+
+    def _push(self, job: OsintJob):
+        heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+        self.queued += 1
+        self._available.release()
+
+    def _queued_background(self) -> int:
+        return sum(
+            1 for priority, _, job in self._heap
+            if priority >= PRIORITY_BACKGROUND and job.status == "queued" and job.priority == priority
+        )
+
+    def _evict_background(self) -> bool:
+        """Shed the newest waiting background job to make room; False if there is none"""
+        victims = [
+            (seq, job) for priority, seq, job in self._heap
+            if priority >= PRIORITY_BACKGROUND and job.status == "queued" and job.priority == priority
+        ]
+        if not victims:
+            return False
+        _, job = max(victims, key=lambda entry: entry[0])
+        self._shed_job(job)
+        return True
+
+    def _shed_job(self, job: OsintJob):
+        self.queued -= 1
+        self.shed += 1
+        self._retire(job, "shed", {"error": "OSINT queue full, scan was shed"})
+        if job._on_shed is not None:
+            job._on_shed()
+
+    def _retire(self, job: OsintJob, status: str, result: Optional[Dict[str, Any]]):
+        job._finish(status, result)
+        self._jobs.pop(job.id, None)
+        self._finished.set(job.id, job)
+
+    def _pop(self) -> Optional[OsintJob]:
+        """Pop the best heap entry; None if it was left behind by promotion or shedding"""
+        priority, _, job = heapq.heappop(self._heap)
+        if job.status == "queued" and job.priority == priority:
+            self.queued -= 1
+            return job
+        return None
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._available.acquire()
+            job = self._pop()
+            if job is None:
+                continue
+
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            record_span("osint.queue_wait", (job.started_at - job.created_at).total_seconds())
+            self.running += 1
+            started = loop.time()
+            try:
+                result = await job._run()
+                self._retire(job, "failed" if result and result.get("error") else "done", result)
+            except asyncio.CancelledError:
+                self._retire(job, "failed", {"error": "OSINT worker stopped"})
+                raise
+            except Exception as e:
+                logger.exception(f"OSINT job {job.id} failed")
+                self._retire(job, "failed", {"error": str(e)})
+            finally:
+                self.running -= 1
+                self.completed += 1
+                elapsed = loop.time() - started
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * elapsed
+                record_span("osint.scan", elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "shed": self.shed
+        }
+
+
+osint_jobs = OsintJobQueue()
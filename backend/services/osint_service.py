@@ -1,9 +1,69 @@
 import httpx
 import asyncio
-import subprocess
+import codecs
+import logging
 import os
-import sys
-from typing import Dict, List, Any
+from typing import AsyncIterator, Dict, List, Any, Optional
+
+from config import settings
+from services.http_client import get_http_client, get_fetch_limit
+from services.osint_cache import osint_cache, normalize_username
+from services.osint_jobs import osint_jobs, OsintJob, QueueFull
+from services.site_stats import site_stats
+from services.username_prober import UsernameProber, load_sites, find_sites_file
+from utils.html_text import VisibleTextExtractor
+from utils.priority import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+
+class _ScanBroadcast:
+    """Fan the events of one running scan out to any number of subscribers"""
+    
+    def __init__(self):
+        self.history: List[Dict[str, Any]] = []
+        self.subscribers: List[asyncio.Queue] = []
+        self.job: Optional[OsintJob] = None
+    
+    def publish(self, event: Dict[str, Any]):
+        self.history.append(event)
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+    
+    async def subscribe(self) -> AsyncIterator[Dict[str, Any]]:
+        """Replay events so far, then follow the scan until done or error"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self.history:
+            queue.put_nowait(event)
+        self.subscribers.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                yield event
+                if event["event"] in ("done", "error"):
+                    return
+        finally:
+            self.subscribers.remove(queue)
+
+
+# backend/tookie-osint
+DEFAULT_TOOKIE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tookie-osint")
+
+
+def resolve_tookie_path(configured: str) -> str:
+    """
+    Resolve TOOKIE_BASE_PATH without searching the filesystem.
+    
+    Relative paths are tried against the working directory, then against the
+    repository root (so the README's "backend/tookie-osint" works from either).
+    """
+    if not configured:
+        return DEFAULT_TOOKIE_PATH
+    if os.path.isabs(configured) or os.path.exists(configured):
+        return os.path.abspath(configured)
+    repo_root = os.path.dirname(os.path.dirname(DEFAULT_TOOKIE_PATH))
+    return os.path.join(repo_root, configured)
+
 
 class OsintService:
     """
@@ -11,182 +71,306 @@ class OsintService:
     """
     
     def __init__(self):
-        # Locate brib.py by searching relative to current working directory
-        current_dir = os.getcwd()
-        possible_paths = [
-            os.path.join(current_dir, "tookie-osint"),
-            os.path.join(current_dir, "backend", "tookie-osint"),
-            # Direct path found via search
-            os.path.abspath(os.path.join(current_dir, "backend", "tookie-osint")) 
-        ]
-        
-        self.base_path = None
-        for path in possible_paths:
-            if os.path.exists(os.path.join(path, "brib.py")):
-                self.base_path = path
-                break
-        
-        if not self.base_path:
-             # Last resort: try to find it recursively
-             import glob
-             files = glob.glob("**/brib.py", recursive=True)
-             if files:
-                 self.base_path = os.path.dirname(os.path.abspath(files[0]))
-        
-        if not self.base_path:
-            print("Warning: Could not find tookie-osint/brib.py directory")
-            self.base_path = os.path.join(os.getcwd(), "tookie-osint") # Default fallback
-
-    async def check_username(self, username: str) -> Dict[str, Any]:
-        """Check if username exists using Tookie-OSINT"""
-        results = []
-        
-        # Command to run brib.py
-        # args: --username <user> --scan --fast (fast mode for speed)
-        # We use --fast (mode 1) which uses fsites.json (fewer sites) to be quicker for a demo
-        
-        # Check if python3 or python is available
-        python_cmd = sys.executable
-        
-        script_path = os.path.join(self.base_path, "brib.py")
-        
-        if not os.path.exists(script_path):
-            return {"error": f"Tookie-OSINT script not found at {script_path}"}
-
-        cmd = [
-            python_cmd, 
-            "brib.py", 
-            "--username", username, 
-            "--scan", 
-            "--fast"
-        ]
+        self.base_path = resolve_tookie_path(settings.tookie_base_path)
         
-        try:
-            # Run the process using asyncio.to_thread and subprocess.run to avoid Windows asyncio loop issues
-            # This bypasses the NotImplementedError with SelectorEventLoop on Windows
-            def run_sync_subprocess():
-                # Set PYTHONIOENCODING to utf-8 to avoid UnicodeEncodeError on Windows consoles
-                env = os.environ.copy()
-                env["PYTHONIOENCODING"] = "utf-8"
-                
-                # Note: This is a synchronous blocking call that waits for the process to finish
-                # The OSINT scan can take a long time (minutes), which might cause the web server 
-                # to timeout the request if it exceeds the server's timeout settings.
-                # However, since we're running this in a thread (asyncio.to_thread), 
-                # the main event loop shouldn't be blocked, but the HTTP client might time out.
-                return subprocess.run(
-                    cmd,
-                    cwd=self.base_path,
-                    capture_output=True,
-                    env=env,
-                    stdin=subprocess.DEVNULL, # Ensure non-interactive mode to prevent hanging on prompts
-                    text=True, # Process output as text (string) instead of bytes
-                    encoding='utf-8' # Explicitly use UTF-8 for input/output
-                )
-
-            result = await asyncio.to_thread(run_sync_subprocess)
-            
-            stdout = result.stdout
-            stderr = result.stderr
-            
-            if result.returncode != 0:
-                 error_msg = stderr if stderr else "Unknown error"
-                 print(f"Tookie-OSINT failed: {error_msg}")
-                 return {"error": f"OSINT tool failed with code {result.returncode}: {error_msg}"}
-
-            # Tookie saves output to ./captured/{username}.txt
-            # Let's try to read that file
-            output_file = os.path.join(self.base_path, "captured", f"{username}.txt")
+        self._prober: Optional[UsernameProber] = None
+        # Running scans keyed by normalized username, shared by concurrent requests
+        self._inflight: Dict[str, "_ScanBroadcast"] = {}
+
+    def _get_prober(self) -> UsernameProber:
+        """Load fsites.json once and reuse the prober across scans"""
+        if self._prober is None:
+            sites_file = find_sites_file(self.base_path)
+            if not sites_file:
+                raise FileNotFoundError(f"Tookie-OSINT site list (fsites.json) not found under {self.base_path}")
+            self._prober = UsernameProber(load_sites(sites_file), site_stats=site_stats)
+        return self._prober
+
+    async def stream_username(
+        self,
+        username: str,
+        use_cache: bool = True,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Scan a username and yield events as results arrive:
+        
+        - {"event": "account", "data": account} when a profile is confirmed
+        - {"event": "summary", "data": {"url", "page_summary"}} when its page fetch completes
+        - {"event": "done", "data": <full check_username result>} at the end
+        - {"event": "error", "data": {"error": ...}} if the scan cannot run
+        
+        Cached results are replayed as the same events, with "cached" set on the done payload.
+        Live scans go through the OSINT job queue, which raises QueueFull when it sheds one.
+        """
+        caching = use_cache and settings.osint_cache_enabled
+        
+        if caching:
+            cached, state = await osint_cache.get(username)
+            if state == "stale":
+                if settings.osint_cache_stale_while_revalidate:
+                    self._refresh(username)
+                else:
+                    cached = None
             
-            if os.path.exists(output_file):
-                with open(output_file, "r", encoding="utf-8", errors="ignore") as f:
-                    lines = f.readlines()
-                    for line in lines:
-                        # Tookie output format: "[+] Site: URL" or similar. 
-                        # Based on brib.py logic, it prints results. 
-                        # We need to parse the text file content.
-                        # Assuming lines contain URLs of found profiles.
-                        line = line.strip()
-                        if line and "http" in line:
-                            # Basic extraction
-                            parts = line.split(" ")
-                            for part in parts:
-                                if part.startswith("http"):
-                                    # Extract site name from URL
-                                    from urllib.parse import urlparse
-                                    domain = urlparse(part).netloc
-                                    results.append({
-                                        "site": domain,
-                                        "url": part,
-                                        "status": "found"
-                                    })
-            else:
-                # Fallback: Try to parse stdout if file wasn't created
-                print(f"Output file not found: {output_file}")
-                # Try to see if stdout has info
-                stdout_str = stdout.decode() if stdout else ""
-                if stdout_str:
-                     # Parse stdout
-                     pass
+            if cached is not None:
+                for account in cached.get("found_accounts", []):
+                    yield {"event": "account", "data": account}
+                    if account.get("page_summary"):
+                        yield {"event": "summary", "data": {"url": account["url"], "page_summary": account["page_summary"]}}
+                yield {"event": "done", "data": {**cached, "cached": state}}
+                return
+        
+        async for event in self._start_scan(username, priority).subscribe():
+            yield event
 
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return {"error": f"{str(e)}"}
+    def _refresh(self, username: str):
+        """Re-scan a stale cache entry at background priority; joins any scan already running"""
+        try:
+            self._start_scan(username, PRIORITY_BACKGROUND)
+        except QueueFull:
+            pass  # the stale entry keeps serving until a later request refreshes it
+
+    def _start_scan(self, username: str, priority: int = PRIORITY_INTERACTIVE) -> "_ScanBroadcast":
+        """
+        Return the in-flight scan for this username, queueing one if needed.
+        
+        Concurrent requests for the same handle share a single scan job; an
+        interactive request joining a queued background scan promotes it. The scan
+        runs to completion (bounded by the scan timeout) so its result is cached
+        even if every subscriber disconnects. Raises QueueFull when shed.
+        """
+        key = normalize_username(username)
+        scan = self._inflight.get(key)
+        if scan is not None:
+            osint_jobs.promote(scan.job, priority)
+            return scan
+        
+        scan = _ScanBroadcast()
         
-        # Fetch content for found accounts asynchronously
-        if results:
+        async def run() -> Dict[str, Any]:
+            final: Dict[str, Any] = {"error": "OSINT scan ended without a result"}
             try:
-                async with httpx.AsyncClient(verify=False) as client:
-                    tasks = [self._fetch_page_content(client, res['url']) for res in results]
-                    contents = await asyncio.gather(*tasks)
-                    
-                    for res, content in zip(results, contents):
-                        if content:
-                            res['page_summary'] = content
+                async for event in self._scan_events(username):
+                    if event["event"] == "done" and settings.osint_cache_enabled:
+                        await osint_cache.set(username, event["data"])
+                    if event["event"] in ("done", "error"):
+                        final = event["data"]
+                    scan.publish(event)
+            except asyncio.CancelledError:
+                # Worker stopped or job timed out: subscribers must not wait for an event that never comes
+                scan.publish({"event": "error", "data": {"error": "OSINT scan was cancelled"}})
+                raise
             except Exception as e:
-                print(f"Error fetching page contents: {e}")
+                logger.error(f"OSINT scan failed: {e}")
+                final = {"error": str(e)}
+                scan.publish({"event": "error", "data": final})
+            finally:
+                self._inflight.pop(key, None)
+            return final
+        
+        def on_shed():
+            self._inflight.pop(key, None)
+            scan.publish({"event": "error", "data": {"error": "OSINT queue full, scan was shed"}})
+        
+        scan.job = osint_jobs.submit(username, run, priority=priority, on_shed=on_shed)
+        self._inflight[key] = scan
+        return scan
 
-        print(f"Results: {results}")
-        return {
-            "username": username,
-            "found_accounts": results,
-            "total_checked": "Fast Scan Mode"
-        }
+    async def submit_scan(self, username: str, priority: int = PRIORITY_INTERACTIVE) -> OsintJob:
+        """Queue a scan without waiting for it; cache hits come back as finished jobs"""
+        if settings.osint_cache_enabled:
+            cached, state = await osint_cache.get(username)
+            if state == "stale" and settings.osint_cache_stale_while_revalidate:
+                self._refresh(username)
+            elif state == "stale":
+                cached = None
+            if cached is not None:
+                return osint_jobs.completed_job(username, {**cached, "cached": state})
+        return self._start_scan(username, priority).job
 
-    async def _fetch_page_content(self, client: httpx.AsyncClient, url: str) -> str:
-        """Fetch and summarize page content"""
+    async def _scan_events(self, username: str) -> AsyncIterator[Dict[str, Any]]:
+        """Run a live scan and yield its events (see stream_username)"""
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            response = await client.get(url, headers=headers, timeout=5.0, follow_redirects=True)
+            prober = self._get_prober()
+        except Exception as e:
+            yield {"event": "error", "data": {"error": str(e)}}
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        stats: Dict[str, Any] = {}
+        results: List[Dict[str, Any]] = []
+
+        client = get_http_client()
+
+        async def fetch_summary(account: Dict[str, Any]):
+            content = await self._fetch_page_content(client, account["url"])
+            if content:
+                account["page_summary"] = content
+                await queue.put({"event": "summary", "data": {"url": account["url"], "page_summary": content}})
+
+        async def produce():
+            fetches = []
+            try:
+                async for account in prober.iter_probe(username, client=client, stats=stats):
+                    results.append(account)
+                    await queue.put({"event": "account", "data": dict(account)})
+                    fetches.append(asyncio.create_task(fetch_summary(account)))
+                if fetches:
+                    await asyncio.gather(*fetches, return_exceptions=True)
+            except asyncio.CancelledError:
+                for task in fetches:
+                    task.cancel()
+                raise
+            except Exception as e:
+                logger.exception("OSINT scan failed")
+                await queue.put({"event": "error", "data": {"error": f"{str(e)}"}})
+                return
             
-            if response.status_code == 200:
-                content = response.text
-                
-                # Clean HTML
+            results.sort(key=lambda r: r["site"])
+            await queue.put({"event": "done", "data": {
+                "username": username,
+                "found_accounts": results,
+                "total_checked": stats.get("sites_checked", 0),
+                "timed_out": stats.get("sites_timed_out", 0),
+                "skipped": stats.get("sites_skipped", 0),
+                "stopped_early": stats.get("stopped_early", False),
+                "scan_ms": stats.get("elapsed_ms")
+            }})
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                event = await queue.get()
+                yield event
+                if event["event"] in ("done", "error"):
+                    break
+        finally:
+            # Consumer went away (e.g. client disconnected): stop scanning
+            if not producer.done():
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+
+    async def check_username(self, username: str, priority: int = PRIORITY_INTERACTIVE) -> Dict[str, Any]:
+        """Check if username exists on the Tookie-OSINT fast-mode site list"""
+        result: Dict[str, Any] = {"error": "OSINT scan ended without a result"}
+        async for event in self.stream_username(username, priority=priority):
+            if event["event"] in ("done", "error"):
+                result = event["data"]
+        return result
+
+    async def stream_candidates(
+        self,
+        candidates: List[str],
+        time_budget: Optional[float] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Scan several candidate handles at once within one overall time budget.
+        
+        Yields the same event types as stream_username. Accounts are deduplicated
+        by URL and tagged with the handle that found them. The final done event ranks
+        them by site confidence and by how likely their handle was.
+        """
+        if not candidates:
+            yield {"event": "error", "data": {"error": "No candidate handles to scan"}}
+            return
+        
+        time_budget = time_budget or settings.osint_candidates_budget
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def pump(handle: str, rank: int):
+            try:
+                async for event in self.stream_username(handle, priority=priority):
+                    await queue.put((handle, rank, event))
+            except QueueFull as e:
+                # Shed handles count as finished so the others are not held up
+                await queue.put((handle, rank, {"event": "error", "data": {"error": str(e)}}))
+        
+        tasks = [asyncio.create_task(pump(handle, rank)) for rank, handle in enumerate(candidates)]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + time_budget
+        accounts: Dict[str, Dict[str, Any]] = {}
+        finished: Dict[str, Dict[str, Any]] = {}
+        
+        try:
+            while len(finished) < len(candidates):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
                 try:
-                    from bs4 import BeautifulSoup
-                    soup = BeautifulSoup(content, 'html.parser')
-                    
-                    # Remove noise
-                    for tag in soup(["script", "style", "meta", "link", "noscript", "header", "footer", "nav"]):
-                        tag.extract()
-                        
-                    text = soup.get_text(separator=' ', strip=True)
-                except ImportError:
-                    # Fallback if bs4 missing
-                    import re
-                    text = re.sub(r'<[^>]+>', ' ', content)
-                    text = re.sub(r'\s+', ' ', text).strip()
+                    handle, rank, event = await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
                 
-                # Truncate to keep it brief (200 chars)
-                if len(text) > 200:
-                    return text[:200] + "..."
-                return text
+                data = event["data"]
+                if event["event"] == "account":
+                    if data["url"] not in accounts:
+                        account = {**data, "handle": handle, "handle_rank": rank}
+                        accounts[data["url"]] = account
+                        yield {"event": "account", "data": account}
+                elif event["event"] == "summary":
+                    account = accounts.get(data["url"])
+                    if account is not None and not account.get("page_summary"):
+                        account["page_summary"] = data["page_summary"]
+                        yield event
+                else:
+                    finished[handle] = data
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        confidence_weight = {"high": 3, "medium": 2, "low": 1}
+        ranked = sorted(
+            accounts.values(),
+            key=lambda a: confidence_weight.get(a.get("confidence"), 2) + 1 / (1 + a["handle_rank"]),
+            reverse=True
+        )
+        yield {"event": "done", "data": {
+            "username": candidates[0],
+            "candidates": candidates,
+            "found_accounts": ranked,
+            "candidates_scanned": [handle for handle in candidates if handle in finished],
+            "candidates_timed_out": [handle for handle in candidates if handle not in finished]
+        }}
+
+    async def check_candidates(
+        self,
+        candidates: List[str],
+        time_budget: Optional[float] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> Dict[str, Any]:
+        """Scan candidate handles and return the merged, ranked result"""
+        result: Dict[str, Any] = {"error": "OSINT scan ended without a result"}
+        async for event in self.stream_candidates(candidates, time_budget, priority):
+            if event["event"] in ("done", "error"):
+                result = event["data"]
+        return result
+
+    async def _fetch_page_content(self, client: httpx.AsyncClient, url: str) -> Optional[str]:
+        """
+        Fetch a short visible-text preview of a profile page.
+        
+        The body is streamed and parsing stops once enough text is collected
+        or OSINT_FETCH_MAX_BYTES have been read, whichever comes first.
+        """
+        try:
+            async with get_fetch_limit():
+                async with client.stream("GET", url, timeout=5.0, follow_redirects=True) as response:
+                    if response.status_code != 200:
+                        return None
+                    
+                    extractor = VisibleTextExtractor(limit=settings.osint_summary_chars)
+                    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="ignore")
+                    received = 0
+                    async for chunk in response.aiter_bytes():
+                        received += len(chunk)
+                        extractor.feed(decoder.decode(chunk))
+                        if extractor.done or received >= settings.osint_fetch_max_bytes:
+                            break
+                    
+                    return extractor.text() or None
         except Exception:
             pass
         return None
-
-
@@ -0,0 +1,28 @@
+"""
+Process-wide service singletons, built on first use.
+
+Use as FastAPI dependencies (`Depends(get_ai_service)`) or call directly from
+helpers. Heavy imports such as the OpenAI SDK happen inside the providers, so
+importing the app stays cheap and a service is only built when first needed.
+"""
+
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from services.ai_service import AIService
+    from services.osint_service import OsintService
+
+
+@lru_cache(maxsize=None)
+def get_ai_service() -> "AIService":
+    """Shared AIService (one OpenAI client and connection pool per process)"""
+    from services.ai_service import AIService
+    return AIService()
+
+
+@lru_cache(maxsize=None)
+def get_osint_service() -> "OsintService":
+    """Shared OsintService, so every router joins the same in-flight scans"""
+    from services.osint_service import OsintService
+    return OsintService()
@@ -0,0 +1,113 @@
+"""Per-site probe statistics, ordering and circuit breaking for username scans"""
+
+import time
+from typing import Dict, Any, List, Optional
+
+from config import settings
+
+# Below this many probes a site's hit rate says little about it
+MIN_PROBES_FOR_CONFIDENCE = 20
+
+
+class _SiteRecord:
+    __slots__ = ("probes", "hits", "errors", "latency_ms", "consecutive_errors", "open_until")
+
+    def __init__(self):
+        self.probes = 0
+        self.hits = 0
+        self.errors = 0
+        self.latency_ms: Optional[float] = None  # exponentially weighted moving average
+        self.consecutive_errors = 0
+        self.open_until = 0.0
+
+
+class SiteStats:
+    """
+    In-process record of how each profile site behaves.
+
+    Scans probe sites in order of expected value (hit rate per second of latency)
+    and skip sites whose circuit breaker is open after repeated errors. An open
+    breaker lets a single probe through once its cooldown passes.
+    """
+
+    def __init__(self, breaker_threshold: Optional[int] = None, breaker_cooldown: Optional[float] = None):
+        self.breaker_threshold = breaker_threshold or settings.osint_breaker_threshold
+        self.breaker_cooldown = breaker_cooldown or settings.osint_breaker_cooldown
+        self._sites: Dict[str, _SiteRecord] = {}
+
+    def _record_for(self, site: Dict[str, Any]) -> _SiteRecord:
+        record = self._sites.get(site["url"])
+        if record is None:
+            record = self._sites[site["url"]] = _SiteRecord()
+        return record
+
+    def record(self, site: Dict[str, Any], outcome: str, elapsed_ms: Optional[float] = None):
+        """Record a probe outcome: hit, miss or error"""
+        record = self._record_for(site)
+        record.probes += 1
+        if elapsed_ms is not None:
+            record.latency_ms = elapsed_ms if record.latency_ms is None else 0.8 * record.latency_ms + 0.2 * elapsed_ms
+
+        if outcome == "error":
+            record.errors += 1
+            record.consecutive_errors += 1
+            if record.consecutive_errors >= self.breaker_threshold:
+                record.open_until = time.monotonic() + self.breaker_cooldown
+            return
+
+        record.consecutive_errors = 0
+        record.open_until = 0.0
+        if outcome == "hit":
+            record.hits += 1
+
+    def is_open(self, site: Dict[str, Any]) -> bool:
+        """True while the site's breaker is open; lets one trial probe through after the cooldown"""
+        record = self._sites.get(site["url"])
+        if record is None or not record.open_until:
+            return False
+        if time.monotonic() < record.open_until:
+            return True
+        # Half-open: allow this probe, re-open immediately if it fails too
+        record.open_until = 0.0
+        record.consecutive_errors = self.breaker_threshold - 1
+        return False
+
+    def expected_value(self, site: Dict[str, Any]) -> float:
+        """Smoothed hit rate per second of typical latency"""
+        record = self._sites.get(site["url"])
+        if record is None:
+            # Unknown sites go first so they get measured
+            return float("inf")
+        hit_rate = (record.hits + 1) / (record.probes + 2)
+        latency_s = max((record.latency_ms or 1000.0) / 1000, 0.05)
+        return hit_rate / latency_s
+
+    def order(self, sites: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Sites to probe, best expected value first, with open breakers removed"""
+        candidates = [site for site in sites if not self.is_open(site)]
+        return sorted(candidates, key=self.expected_value, reverse=True)
+
+    def confidence(self, site: Dict[str, Any]) -> str:
+        """
+        How much a "found" from this site is worth: sites that verify a not-found
+        marker are "high"; sites that answer 200 for almost every handle are "low".
+        """
+        record = self._sites.get(site["url"])
+        if record is None or record.probes < MIN_PROBES_FOR_CONFIDENCE:
+            return "high" if site.get("error_message") else "medium"
+        hit_rate = record.hits / record.probes
+        if hit_rate > 0.8:
+            return "low"
+        if site.get("error_message") or hit_rate <= 0.5:
+            return "high"
+        return "medium"
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "sites_tracked": len(self._sites),
+            "breakers_open": sum(1 for record in self._sites.values() if record.open_until > now)
+        }
+
+
+site_stats = SiteStats()
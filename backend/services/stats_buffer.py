@@ -0,0 +1,104 @@
+"""Write-coalescing buffer for user stats counters"""
+
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+
+from pymongo import UpdateOne
+
+from config import settings
+from database import get_database
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+class StatsBuffer:
+    """
+    Fold per-user `stats.*` increments in memory and flush them periodically
+    as a single unordered `bulk_write` of `$inc` operations.
+    """
+
+    def __init__(self, flush_interval: Optional[float] = None):
+        self.flush_interval = flush_interval if flush_interval is not None else settings.stats_flush_interval
+        # user _id -> {"stats.total_analyses": n, ...}
+        self._pending: Dict[Any, Dict[str, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def increment(self, user_id: Any, field: str, amount: int = 1):
+        """Queue an increment of `stats.<field>` for the user document `_id`"""
+        key = f"stats.{field}"
+        counters = self._pending.setdefault(user_id, {})
+        counters[key] = counters.get(key, 0) + amount
+
+    def pending_for(self, user_id: Any) -> Dict[str, int]:
+        """Unflushed increments for a user, keyed by stats field name"""
+        counters = self._pending.get(user_id, {})
+        return {key.split(".", 1)[1]: value for key, value in counters.items()}
+
+    def merge_stats(self, user_id: Any, stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Return a copy of a stored stats dict with unflushed increments added"""
+        merged = dict(stats or {})
+        for field, value in self.pending_for(user_id).items():
+            merged[field] = merged.get(field, 0) + value
+        return merged
+
+    async def flush(self) -> int:
+        """Write all pending increments; returns the number of user documents updated"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            # Swap the buffer out so increments arriving during the write go to the next batch
+            batch, self._pending = self._pending, {}
+            operations = [
+                UpdateOne({"_id": user_id}, {"$inc": counters})
+                for user_id, counters in batch.items()
+            ]
+
+            try:
+                db = await get_database()
+                with span("db.stats_flush"):
+                    await db.users.bulk_write(operations, ordered=False)
+            except Exception as e:
+                logger.error(f"Stats flush failed, re-queueing {len(batch)} users: {e}")
+                for user_id, counters in batch.items():
+                    for key, value in counters.items():
+                        pending = self._pending.setdefault(user_id, {})
+                        pending[key] = pending.get(key, 0) + value
+                return 0
+
+            # Cached user documents still hold the pre-flush stats, and the pending
+            # counters merged on top of them are gone now
+            from api.auth import user_cache  # deferred: api.auth imports this module
+            for user_id in batch:
+                user_cache.invalidate(str(user_id))
+            return len(operations)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending_users": len(self._pending)}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        """Start the periodic flush task on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the periodic task and flush whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+stats_buffer = StatsBuffer()
@@ -0,0 +1,256 @@
+"""In-process async username prober using Tookie-OSINT site definitions"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, List, Any, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from config import settings
+from services.http_client import USER_AGENT
+from services.site_stats import SiteStats
+
+logger = logging.getLogger(__name__)
+
+
+def _site_entry(name: Optional[str], value: Any) -> Optional[Dict[str, Any]]:
+    """Normalize one site definition into {"name", "url", "error_message"}"""
+    error_message = None
+    if isinstance(value, dict):
+        url = value.get("url") or value.get("site") or value.get("uri")
+        error_message = value.get("errorMessage") or value.get("error_msg") or value.get("error")
+        name = name or value.get("name")
+    else:
+        url = value
+
+    if not isinstance(url, str) or not url.startswith("http"):
+        return None
+
+    # Tookie lists profile URL prefixes; accept explicit placeholders as well
+    for placeholder in ("{username}", "{}", "{user}"):
+        if placeholder in url:
+            url = url.replace(placeholder, "{username}")
+            break
+    else:
+        url = url + "{username}"
+
+    return {
+        "name": name or urlparse(url).netloc,
+        "url": url,
+        "error_message": error_message if isinstance(error_message, str) else None
+    }
+
+
+def load_sites(path: str) -> List[Dict[str, Any]]:
+    """
+    Load site definitions from a Tookie-style JSON file.
+
+    Accepts a list of URLs, a list of objects with a url/site field, or a
+    mapping of site name to URL or object.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+
+    if isinstance(raw, dict):
+        items = list(raw.items())
+    elif isinstance(raw, list):
+        items = [(None, value) for value in raw]
+    else:
+        raise ValueError(f"Unsupported site definition format in {path}")
+
+    sites = []
+    seen = set()
+    for name, value in items:
+        entry = _site_entry(name, value)
+        if entry and entry["url"] not in seen:
+            seen.add(entry["url"])
+            sites.append(entry)
+    return sites
+
+
+class UsernameProber:
+    """
+    Check a username against many profile sites concurrently.
+
+    Concurrency is bounded globally and per host; the whole scan stops at
+    `scan_timeout` seconds and outstanding probes are cancelled. With a
+    SiteStats instance, sites are probed in order of expected value, sites with
+    an open circuit breaker are skipped, and each result carries a confidence.
+    """
+
+    def __init__(
+        self,
+        sites: List[Dict[str, Any]],
+        concurrency: Optional[int] = None,
+        per_host: Optional[int] = None,
+        request_timeout: Optional[float] = None,
+        scan_timeout: Optional[float] = None,
+        site_stats: Optional[SiteStats] = None
+    ):
+        self.sites = sites
+        self.site_stats = site_stats
+        self.concurrency = concurrency or settings.osint_probe_concurrency
+        self.per_host = per_host or settings.osint_probe_per_host
+        self.request_timeout = request_timeout or settings.osint_probe_timeout
+        self.scan_timeout = scan_timeout or settings.osint_scan_timeout
+
+    async def _probe_site(
+        self,
+        client: httpx.AsyncClient,
+        site: Dict[str, Any],
+        username: str,
+        global_limit: asyncio.Semaphore,
+        host_limits: Dict[str, asyncio.Semaphore]
+    ) -> Optional[Dict[str, Any]]:
+        url = site["url"].replace("{username}", username)
+        host = urlparse(url).netloc
+        host_limit = host_limits.setdefault(host, asyncio.Semaphore(self.per_host))
+
+        async with global_limit, host_limit:
+            started = time.perf_counter()
+            found = False
+            try:
+                async with client.stream(
+                    "GET", url, follow_redirects=False, timeout=self.request_timeout
+                ) as response:
+                    found = response.status_code == 200
+                    # Only sites with a "not found" marker need the body, and only its head
+                    if found and site["error_message"]:
+                        body = b""
+                        async for chunk in response.aiter_bytes():
+                            body += chunk
+                            if len(body) >= settings.osint_fetch_max_bytes:
+                                break
+                        found = site["error_message"] not in body.decode(response.encoding or "utf-8", errors="ignore")
+            except httpx.HTTPError:
+                if self.site_stats:
+                    self.site_stats.record(site, "error")
+                return None
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        if self.site_stats:
+            self.site_stats.record(
+                site,
+                "hit" if found else ("error" if response.status_code >= 500 else "miss"),
+                elapsed_ms
+            )
+        if not found:
+            return None
+
+        return {
+            "site": host,
+            "url": url,
+            "status": "found",
+            "http_status": response.status_code,
+            "elapsed_ms": elapsed_ms,
+            "confidence": self.site_stats.confidence(site) if self.site_stats else "medium"
+        }
+
+    def _new_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=httpx.Timeout(self.request_timeout),
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            follow_redirects=False,
+            verify=False
+        )
+
+    async def iter_probe(
+        self,
+        username: str,
+        client: Optional[httpx.AsyncClient] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        max_found: Optional[int] = None,
+        time_budget: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield each confirmed profile as soon as its probe finishes.
+
+        "Good enough" mode stops early once `max_found` high-confidence profiles
+        are found or `time_budget` seconds pass (both default to settings; 0 disables).
+        `stats`, if given, is filled with sites_checked/sites_timed_out/sites_skipped/
+        elapsed_ms/stopped_early once the scan ends. Closing the generator early
+        cancels outstanding probes.
+        """
+        if max_found is None:
+            max_found = settings.osint_good_enough_found
+        if time_budget is None:
+            time_budget = settings.osint_good_enough_budget
+        owns_client = client is None
+        if owns_client:
+            client = self._new_client()
+
+        global_limit = asyncio.Semaphore(self.concurrency)
+        host_limits: Dict[str, asyncio.Semaphore] = {}
+        started = time.perf_counter()
+        budget_limited = bool(time_budget) and time_budget < self.scan_timeout
+        deadline = started + (time_budget if budget_limited else self.scan_timeout)
+        # Tasks are created in priority order and the semaphores wake waiters FIFO
+        sites = self.site_stats.order(self.sites) if self.site_stats else self.sites
+        pending = {
+            asyncio.create_task(self._probe_site(client, site, username, global_limit, host_limits))
+            for site in sites
+        }
+        checked = 0
+        confident = 0
+        enough_found = False
+
+        try:
+            while pending:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    checked += 1
+                    if task.exception() is None and task.result():
+                        result = task.result()
+                        if result["confidence"] == "high":
+                            confident += 1
+                        yield result
+                if max_found and confident >= max_found:
+                    enough_found = True
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            if owns_client:
+                await client.aclose()
+            if stats is not None:
+                stats.update({
+                    "sites_checked": checked,
+                    "sites_timed_out": len(pending),
+                    "sites_skipped": len(self.sites) - len(sites),
+                    "stopped_early": bool(pending) and (enough_found or budget_limited),
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+                })
+
+    async def probe(
+        self,
+        username: str,
+        client: Optional[httpx.AsyncClient] = None
+    ) -> Dict[str, Any]:
+        """Probe every site for `username` and return the confirmed profiles"""
+        stats: Dict[str, Any] = {}
+        found = [result async for result in self.iter_probe(username, client, stats)]
+        found.sort(key=lambda r: r["site"])
+        return {"found_accounts": found, **stats}
+
+
+def find_sites_file(base_path: str) -> Optional[str]:
+    """Locate fsites.json inside a Tookie-OSINT checkout"""
+    if settings.osint_sites_file:
+        return settings.osint_sites_file
+    for candidate in (
+        os.path.join(base_path, "sites", "fsites.json"),
+        os.path.join(base_path, "fsites.json"),
+    ):
+        if os.path.exists(candidate):
+            return candidate
+    return None
@@ -0,0 +1,35 @@
+"""Per-request deadlines carried through multi-stage pipelines"""
+
+import asyncio
+import time
+from typing import Any
+
+
+class Deadline:
+    """A point in time by which a request should have answered"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left, never negative"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    async def wait(self, task: "asyncio.Future", reserve: float = 0.0) -> Any:
+        """
+        Wait for a task until the deadline minus `reserve` seconds.
+
+        Raises asyncio.TimeoutError when time runs out but leaves the task
+        running, so the caller can finish it in the background.
+        """
+        timeout = self.remaining() - reserve
+        if timeout <= 0 and not task.done():
+            raise asyncio.TimeoutError()
+        done, _ = await asyncio.wait({task}, timeout=max(timeout, 0))
+        if not done:
+            raise asyncio.TimeoutError()
+        return task.result()
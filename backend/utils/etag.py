@@ -0,0 +1,71 @@
+"""Strong ETags and conditional GETs from cheap document version lookups"""
+
+import hashlib
+from typing import Any, Dict, Optional, Tuple
+
+from starlette.responses import Response
+
+from utils.responses import FastJSONResponse
+
+# Added by CompressionMiddleware so the gzip and identity bodies have different strong ETags
+GZIP_SUFFIX = "-gzip"
+
+# Clients keep the body but must revalidate it before every use
+CACHE_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Authorization"}
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag over the version inputs of a representation"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:24]}"'
+
+
+def match_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """
+    The If-None-Match tag that matches etag, or None.
+
+    Uses weak comparison, as RFC 9110 specifies for GET. The tag is returned
+    as the client sent it, so a 304 for a cached gzip body echoes its -gzip tag.
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        opaque = candidate[2:] if candidate.startswith("W/") else candidate
+        if opaque.endswith(GZIP_SUFFIX + '"'):
+            opaque = opaque[:-len(GZIP_SUFFIX) - 1] + '"'
+        if opaque == etag:
+            return candidate
+    return None
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, **CACHE_HEADERS})
+
+
+def tagged_response(content: Any, etag: str) -> FastJSONResponse:
+    return FastJSONResponse(content, headers={"ETag": etag, **CACHE_HEADERS})
+
+
+async def collection_version(collection, match: Dict[str, Any]) -> Tuple[int, Any]:
+    """
+    (count, latest change) of the documents matching `match`, in one round trip.
+
+    Latest change is the newest updated_at, falling back to timestamp for
+    documents that have never been updated; adding, editing or deleting any
+    matching document changes the pair.
+    """
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "latest": {"$max": {"$ifNull": ["$updated_at", "$timestamp"]}}
+        }}
+    ]
+    rows = await collection.aggregate(pipeline).to_list(length=1)
+    if not rows:
+        return 0, None
+    return rows[0]["count"], rows[0]["latest"]
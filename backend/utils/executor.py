@@ -0,0 +1,67 @@
+"""Bounded thread pool for CPU-heavy work that must stay off the event loop"""
+
+import asyncio
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class ExecutorBusy(Exception):
+    """Raised when the executor queue is full; carries a suggested retry delay in seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Executor busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """
+    Run blocking callables on a dedicated thread pool with a cap on queued work.
+
+    Calls beyond `max_pending` (running plus waiting) are rejected with ExecutorBusy
+    instead of growing an unbounded backlog.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        expected_duration: float = 0.25
+    ):
+        self.name = name
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 8
+        self.expected_duration = expected_duration
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def retry_after(self) -> int:
+        """Rough seconds until the current backlog drains"""
+        return max(1, math.ceil(self.pending / self.workers * self.expected_duration))
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(*args) on the pool, raising ExecutorBusy when the queue is full"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorBusy(self.retry_after())
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        """Stop the worker threads"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
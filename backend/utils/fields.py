@@ -0,0 +1,71 @@
+"""Sparse fieldsets: ?fields= turned into MongoDB projections"""
+
+import re
+from typing import Any, Dict, Optional, Sequence
+
+from fastapi import HTTPException, Query
+
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+ALL_FIELDS = "*"
+
+
+class FieldSelection:
+    """
+    Which fields of a document to load and return.
+
+    No ?fields= gives the slim default: everything except slim_exclude (image
+    data, raw model text). fields=* loads the full document. Otherwise only the
+    listed (optionally dotted) fields are loaded, plus `required` ones the
+    endpoint needs itself, such as user_id for the ownership check; those are
+    trimmed again unless asked for. The id is always returned.
+    """
+
+    def __init__(self, fields: Optional[str], slim_exclude: Sequence[str] = (), required: Sequence[str] = ()):
+        self.hidden: Sequence[str] = ()
+        fields = (fields or "").strip()
+        # Identifies the representation, e.g. for ETags
+        self.key = fields
+        if not fields:
+            self.projection: Optional[Dict[str, int]] = {path: 0 for path in slim_exclude} or None
+            return
+        if fields == ALL_FIELDS:
+            self.projection = None
+            return
+
+        names = {name.strip() for name in fields.split(",") if name.strip()}
+        invalid = sorted(name for name in names if not FIELD_NAME.match(name))
+        if invalid:
+            raise ValueError(f"Invalid field name(s): {', '.join(invalid)}")
+        names.discard("id")
+        self.key = ",".join(sorted(names))
+        self.hidden = [name for name in required if name not in names]
+        names.update(required)
+        # MongoDB rejects a projection holding both a path and one of its parents
+        self.projection = {
+            name: 1 for name in names
+            if not any(name.startswith(other + ".") for other in names)
+        }
+
+    def trim(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Drop the fields loaded only for the endpoint's own use"""
+        for name in self.hidden:
+            doc.pop(name, None)
+        return doc
+
+
+def sparse_fields(slim_exclude: Sequence[str] = (), required: Sequence[str] = ()):
+    """FastAPI dependency reading ?fields= into a FieldSelection"""
+
+    def dependency(
+        fields: Optional[str] = Query(
+            None,
+            description="Comma-separated fields to return, or * for the full document. "
+                        f"Omitted: everything except {', '.join(slim_exclude) or 'nothing'}."
+        )
+    ) -> FieldSelection:
+        try:
+            return FieldSelection(fields, slim_exclude, required)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return dependency
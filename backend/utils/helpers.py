@@ -1,9 +1,9 @@
 """Utility helper functions"""
 
 import base64
+import json
 import re
-from typing import Optional
-from PIL import Image
+from typing import Any, Optional
 import io
 
 
@@ -18,6 +18,7 @@ def decode_base64_image(base64_string: str) -> bytes:
 
 def validate_image_format(image_bytes: bytes) -> bool:
     """Validate that image bytes are a valid image format"""
+    from PIL import Image  # deferred: Pillow is only needed on the upload path
     try:
         img = Image.open(io.BytesIO(image_bytes))
         img.verify()
@@ -28,6 +29,7 @@ def validate_image_format(image_bytes: bytes) -> bool:
 
 def get_image_dimensions(image_bytes: bytes) -> Optional[tuple]:
     """Get image dimensions (width, height)"""
+    from PIL import Image
     try:
         img = Image.open(io.BytesIO(image_bytes))
         return img.size
@@ -41,3 +43,19 @@ def sanitize_filename(filename: str) -> str:
     sanitized = re.sub(r'[^a-zA-Z0-9._-]', '_', filename)
     return sanitized[:255]  # Limit length
 
+
+def strip_code_fence(content: str) -> str:
+    """Remove the markdown code fence models sometimes wrap JSON in"""
+    content = content.strip()
+    if content.startswith("```json"):
+        content = content[7:]
+    if content.startswith("```"):
+        content = content[3:]
+    if content.endswith("```"):
+        content = content[:-3]
+    return content.strip()
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,55 @@
+"""Incremental visible-text extraction from HTML"""
+
+import re
+from html.parser import HTMLParser
+
+# Elements whose content is never shown as page text
+SKIP_TAGS = {"script", "style", "noscript", "header", "footer", "nav", "template", "svg"}
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class VisibleTextExtractor(HTMLParser):
+    """
+    Collect visible text from HTML fed in chunks, stopping once `limit`
+    characters are gathered so callers can abandon the rest of the download.
+    """
+
+    def __init__(self, limit: int = 200):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self._parts = []
+        self._length = 0
+        self._skip_depth = 0
+
+    @property
+    def done(self) -> bool:
+        # One character past the limit tells us the text was truncated
+        return self._length > self.limit
+
+    def feed(self, data: str):
+        if not self.done:
+            super().feed(data)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if self._skip_depth or self.done:
+            return
+        text = _WHITESPACE.sub(" ", data).strip()
+        if text:
+            self._parts.append(text)
+            self._length += len(text) + 1
+
+    def text(self) -> str:
+        """Collected text, truncated to `limit` characters with a trailing ellipsis"""
+        text = " ".join(self._parts)
+        if len(text) > self.limit:
+            return text[:self.limit] + "..."
+        return text
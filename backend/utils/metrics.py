@@ -0,0 +1,171 @@
+"""
+Request spans, in-process histograms and Prometheus text exposition.
+
+`span("stage")` times a block of code. The duration is recorded in the
+per-stage histogram and, when running inside a request, added to that
+request's Server-Timing header by TimingMiddleware.
+"""
+
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Seconds; covers cache hits through multi-minute OSINT scans
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Spans finished during the current request, as (name, seconds)
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label set"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with one series per label set"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._series: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    """Histograms and counters owned here, plus collectors that read other modules' stats at scrape time"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        # name -> (help, type, callback returning {labels: value})
+        self._collectors: Dict[str, Tuple[str, str, Callable[[], Dict[Labels, float]]]] = {}
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, help_text, buckets)
+        return self._metrics[name]
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        if name not in self._metrics:
+            self._metrics[name] = Counter(name, help_text)
+        return self._metrics[name]
+
+    def collect(self, name: str, help_text: str, callback: Callable[[], Dict[Labels, float]], kind: str = "gauge"):
+        """
+        Register a metric read at scrape time; callback returns {(("label", "value"), ...): number}.
+        Use kind="counter" for running totals that services already keep.
+        """
+        self._collectors[name] = (help_text, kind, callback)
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for name, (help_text, kind, callback) in self._collectors.items():
+            try:
+                series = callback()
+            except Exception:
+                continue  # a broken collector must not break the scrape
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(key)} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels) + "}"
+
+
+registry = MetricsRegistry()
+
+request_duration = registry.histogram(
+    "sherlock_request_duration_seconds", "HTTP request latency by route template, method and status"
+)
+stage_duration = registry.histogram(
+    "sherlock_stage_duration_seconds", "Latency of instrumented pipeline stages"
+)
+upstream_tokens = registry.counter(
+    "sherlock_upstream_tokens_total", "Tokens billed by the model API, by call and kind"
+)
+
+
+def record_span(name: str, seconds: float):
+    """Record a finished stage in the histogram and in the current request's Server-Timing"""
+    stage_duration.observe(seconds, stage=name)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a block as the named stage; works unchanged inside async code"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+def start_request_spans() -> List[Tuple[str, float]]:
+    """Begin collecting spans for the current request (called by TimingMiddleware)"""
+    spans: List[Tuple[str, float]] = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing(spans: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing header value; repeated stages are summed"""
+    merged: Dict[str, float] = {}
+    for name, seconds in spans:
+        merged[name] = merged.get(name, 0.0) + seconds
+    parts = [f"{name.replace('.', '-')};dur={seconds * 1000:.1f}" for name, seconds in merged.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,6 @@
+"""Request priorities shared by the OSINT job queue and model admission control"""
+
+# Lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
@@ -0,0 +1,73 @@
+"""Fast JSON responses: orjson rendering with Mongo types, wired in app-wide"""
+
+import asyncio
+import functools
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.responses import Response
+from starlette.routing import request_response
+
+
+def _default(obj: Any) -> Any:
+    """Types orjson doesn't encode natively (datetimes, UUIDs and enums it does)"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json", by_alias=True)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, bytes):
+        return obj.decode()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; ObjectIds become strings"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _render_directly(call, status_code: int):
+    @functools.wraps(call)
+    async def endpoint(**values):
+        result = await call(**values)
+        if isinstance(result, Response):
+            return result
+        return FastJSONResponse(result, status_code=status_code)
+    return endpoint
+
+
+class FastJSONRoute(APIRoute):
+    """
+    Route that hands plain dict/list results straight to FastJSONResponse.
+
+    FastAPI otherwise runs every result through jsonable_encoder first, which
+    walks the whole document in Python and fails on ObjectId. Routes with a
+    response_model, sync endpoints and other response classes are unchanged.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        response_class = self.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+        if (
+            self.response_field is None
+            and issubclass(response_class, FastJSONResponse)
+            and asyncio.iscoroutinefunction(self.dependant.call)
+        ):
+            self.dependant.call = _render_directly(self.dependant.call, self.status_code or 200)
+            self.app = request_response(self.get_route_handler())
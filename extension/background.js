@@ -1,12 +1,12 @@
 // Background service worker for Screenshot Sherlock
 
+// API_BASE_URL and postWithRetry
+importScripts('utils/api.js');
+
 chrome.runtime.onInstalled.addListener(() => {
   console.log('Screenshot Sherlock extension installed');
 });
 
-// API Base URL
-const API_BASE_URL = 'http://localhost:8000/api';
-
 // Handle messages from content scripts and popup
 chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
   if (request.action === 'captureScreenshot') {
@@ -77,32 +77,15 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
 });
 
 async function performAnalysis(authToken, imageData) {
-  // 1. Upload
+  // Upload and analyze in one request
   const blob = await (await fetch(`data:image/png;base64,${imageData}`)).blob();
   const formData = new FormData();
   formData.append('image', blob, 'snippet.png');
 
-  const uploadRes = await fetch(`${API_BASE_URL}/screenshot/upload`, {
-    method: 'POST',
+  const analyzeRes = await postWithRetry(`${API_BASE_URL}/analyze/upload`, {
     headers: { 'Authorization': `Bearer ${authToken}` },
     body: formData
   });
-  
-  if (!uploadRes.ok) {
-    const err = await uploadRes.text();
-    throw new Error('Upload failed: ' + err);
-  }
-  const { conversation_id } = await uploadRes.json();
-
-  // 2. Analyze
-  const analyzeRes = await fetch(`${API_BASE_URL}/analyze/`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'Authorization': `Bearer ${authToken}`
-      },
-      body: JSON.stringify({ conversation_id })
-  });
 
   if (!analyzeRes.ok) {
     const err = await analyzeRes.text();
@@ -1,6 +1,5 @@
 // Popup script for Screenshot Sherlock
-
-const API_BASE_URL = 'http://localhost:8000/api';
+// API_BASE_URL and postWithRetry come from utils/api.js, loaded first by popup.html
 
 let authToken = null;
 let currentMode = 'visible'; // visible, full, selection
@@ -246,8 +245,7 @@ async function handleCapture() {
       screenshotData = await captureScreenshot();
     }
 
-    const uploadResult = await uploadScreenshot(screenshotData.imageData);
-    const analysis = await analyzeScreenshot(uploadResult.conversation_id);
+    const analysis = await uploadAndAnalyze(screenshotData.imageData);
     
     showAnalysis(analysis);
     await loadRecentAnalyses();
@@ -592,31 +590,16 @@ async function captureScreenshot() {
   });
 }
 
-async function uploadScreenshot(imageData) {
+async function uploadAndAnalyze(imageData) {
   const blob = await base64ToBlob(imageData, 'image/png');
   const formData = new FormData();
   formData.append('image', blob, 'screenshot.png');
   
-  const response = await fetch(`${API_BASE_URL}/screenshot/upload`, {
-    method: 'POST',
+  const response = await postWithRetry(`${API_BASE_URL}/analyze/upload`, {
     headers: { 'Authorization': `Bearer ${authToken}` },
     body: formData
   });
   
-  if (!response.ok) throw new Error('Upload failed');
-  return await response.json();
-}
-
-async function analyzeScreenshot(conversationId) {
-  const response = await fetch(`${API_BASE_URL}/analyze/`, {
-    method: 'POST',
-    headers: {
-      'Content-Type': 'application/json',
-      'Authorization': `Bearer ${authToken}`
-    },
-    body: JSON.stringify({ conversation_id: conversationId })
-  });
-  
   if (!response.ok) throw new Error('Analysis failed');
   return await response.json();
 }
@@ -697,6 +680,12 @@ async function saveSettings() {
       body: JSON.stringify(prefs)
     });
     if (!response.ok) throw new Error('Failed to save');
+    // Stateless tokens carry preferences, so the backend re-issues one on change
+    const data = await response.json();
+    if (data.access_token) {
+      authToken = data.access_token;
+      await setAuthToken(authToken);
+    }
     settingsUI.saveBtn.textContent = 'Saved!';
     setTimeout(() => settingsUI.saveBtn.textContent = originalText, 2000);
   } catch (error) {
@@ -47,8 +47,23 @@ async function apiRequest(endpoint, options = {}) {
   return await response.json();
 }
 
+// POST that survives dropped connections: retries network failures with the
+// same Idempotency-Key, so the backend replays the first attempt's result
+// instead of storing the screenshot or running the analysis twice
+async function postWithRetry(url, options, attempts = 3) {
+  const headers = { ...options.headers, 'Idempotency-Key': crypto.randomUUID() };
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await fetch(url, { ...options, method: 'POST', headers });
+    } catch (error) {
+      if (attempt >= attempts) throw error;
+      await new Promise(resolve => setTimeout(resolve, 500 * attempt));
+    }
+  }
+}
+
 // Export functions
 if (typeof module !== 'undefined' && module.exports) {
-  module.exports = { apiRequest, getAuthToken, setAuthToken };
+  module.exports = { apiRequest, getAuthToken, setAuthToken, postWithRetry };
 }
 